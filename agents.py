@@ -5,15 +5,16 @@ import time
 import requests
 import json
 import getpass
-import subprocess
-import sys
 import os
 import random
-import tempfile # BUG FIX: Re-added missing import
 
 # Import from our other project files
 from config import Colors
 import database
+import governor
+import hackathon
+import task_queue
+import verdict_cache
 
 # --- File Reading Helpers ---
 try:
@@ -46,14 +47,18 @@ def read_docx_text(file_path):
 
 
 # --- Generative AI Function ---
-def call_gemini_api(prompt, is_json_response=False, retries=3):
-    """A robust helper function to call the Gemini API with automatic retries."""
+def call_gemini_api(prompt, is_json_response=False, retries=3, quiet=False):
+    """A robust helper function to call the Gemini API with automatic retries.
+
+    Background jobs pass quiet=True so nothing is printed over the user's prompt.
+    """
+    log = (lambda *args, **kwargs: None) if quiet else print
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
-        print(f"\n{Colors.FAIL}ERROR: GEMINI_API_KEY environment variable not set.{Colors.ENDC}")
+        log(f"\n{Colors.FAIL}ERROR: GEMINI_API_KEY environment variable not set.{Colors.ENDC}")
         return None
 
-    print(f"\n{Colors.CYAN}Maverick is thinking...{Colors.ENDC}")
+    log(f"\n{Colors.CYAN}Maverick is thinking...{Colors.ENDC}")
     
     payload = {"contents": [{"parts": [{"text": prompt}]}]}
     if is_json_response:
@@ -61,7 +66,9 @@ def call_gemini_api(prompt, is_json_response=False, retries=3):
     else:
         payload["generationConfig"] = {"temperature": 1.0}
 
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={api_key}"
+    # GEMINI_API_BASE lets tests and load runs point at a local stand-in
+    api_base = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+    api_url = f"{api_base}/v1beta/models/gemini-1.5-flash:generateContent?key={api_key}"
     headers = {'Content-Type': 'application/json'}
     
     for attempt in range(retries):
@@ -72,17 +79,17 @@ def call_gemini_api(prompt, is_json_response=False, retries=3):
             return part.get('text', 'Could not parse AI response.')
         except requests.exceptions.HTTPError as e:
             if 500 <= e.response.status_code < 600 and attempt < retries - 1:
-                print(f"{Colors.WARNING}Server error ({e.response.status_code}) detected. Retrying in {2 ** attempt} seconds...{Colors.ENDC}")
+                log(f"{Colors.WARNING}Server error ({e.response.status_code}) detected. Retrying in {2 ** attempt} seconds...{Colors.ENDC}")
                 time.sleep(2 ** attempt)
                 continue
             else:
-                print(f"{Colors.FAIL}An HTTP error occurred with the AI API: {e}{Colors.ENDC}")
+                log(f"{Colors.FAIL}An HTTP error occurred with the AI API: {e}{Colors.ENDC}")
                 return None
         except Exception as e:
-            print(f"{Colors.FAIL}An unexpected error occurred with the AI API: {e}{Colors.ENDC}")
+            log(f"{Colors.FAIL}An unexpected error occurred with the AI API: {e}{Colors.ENDC}")
             return None
     
-    print(f"{Colors.FAIL}AI service is still unavailable after {retries} attempts.{Colors.ENDC}")
+    log(f"{Colors.FAIL}AI service is still unavailable after {retries} attempts.{Colors.ENDC}")
     return None
 
 # --- Agent Implementations ---
@@ -268,12 +275,12 @@ def show_dashboard(current_user):
     bar = ('★' * (progress // 10)).ljust(10)
     print(f"{'Progress to next badge:':<25}[{Colors.GREEN}{bar}{Colors.ENDC}] {progress}%")
     
-    summary_prompt = f"User has {current_user['gems']} gems, badge {current_user['badge']}, skill {current_user['skill']}. Give a short motivational summary."
-    summary = call_gemini_api(summary_prompt)
-    print(f"\n{Colors.CYAN}🤖 AI Summary:{Colors.ENDC}")
-    print(summary)
+    task_queue.enqueue('dashboard_summary',
+                       {'gems': current_user['gems'], 'badge': current_user['badge'], 'skill': current_user['skill']},
+                       user_name=current_user['name'], priority=5, dedupe_key=f"dashboard_summary:{current_user['name']}")
+    print(f"\n{Colors.CYAN}🤖 Your AI summary is on its way and will appear shortly.{Colors.ENDC}")
 
-def show_leaderboard():
+def show_leaderboard(current_user=None):
     """Updates all user badges before displaying the leaderboard."""
     print(f"\n{Colors.HEADER}--- 🏆 Syncing Badges ---{Colors.ENDC}")
     all_users = database.get_all_users()
@@ -287,8 +294,18 @@ def show_leaderboard():
         database.batch_update_badges(updates)
         print(f"{Colors.GREEN}Leaderboard badges have been updated!{Colors.ENDC}")
 
-    print(f"\n{Colors.HEADER}=== 🏆 Global Leaderboard ==={Colors.ENDC}")
-    users_for_display = database.get_leaderboard_data()
+    period = input("Leaderboard period (daily/weekly/all) [all]: ").strip().lower() or 'all'
+    if period not in database.LEADERBOARD_PERIODS:
+        print(f"{Colors.WARNING}Unknown period, showing all-time.{Colors.ENDC}")
+        period = 'all'
+    skill = input("Filter by language (python/java/c++) or press Enter for all: ").strip().lower() or None
+    if skill and skill not in ('python', 'java', 'c++'):
+        print(f"{Colors.WARNING}Unknown language, showing all languages.{Colors.ENDC}")
+        skill = None
+
+    title = f"{'All-Time' if period == 'all' else period.capitalize()} {skill.capitalize() if skill else 'Global'} Leaderboard"
+    print(f"\n{Colors.HEADER}=== 🏆 {title} ==={Colors.ENDC}")
+    users_for_display = database.get_leaderboard_data(period, skill)
     print(f"{Colors.BOLD}{'Rank':<6}{'Name':<15}{'Skill':<10}{'Gems 💎':<10}{'Badge':<20}{Colors.ENDC}")
     print("-" * 61)
     for i, user_row in enumerate(users_for_display, 1):
@@ -296,63 +313,107 @@ def show_leaderboard():
         medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f" {i}."
         print(f"{medal:<6}{user['name']:<15}{user['skill']:<10}{user['gems']:<10}{user['badge']:<20}")
     
-    if users_for_display:
+    if users_for_display and current_user:
         top_user_name = dict(users_for_display[0])['name']
-        praise_prompt = f"Give a cool 1-liner praise for coder '{top_user_name}' who topped the leaderboard."
-        comment = call_gemini_api(praise_prompt)
-        print(f"\n{Colors.CYAN}👑 AI Praise for {top_user_name}: {comment}{Colors.ENDC}")
+        task_queue.enqueue('leaderboard_praise', {'top_user': top_user_name}, user_name=current_user['name'], priority=1)
 
 
 # 5. Hackathon Agent
-def hackathon_portal():
+def hackathon_portal(current_user):
     print(f"\n{Colors.HEADER}--- 🏆 Hackathon Portal ---{Colors.ENDC}")
-    print("1. Join 'AI for Good' Hackathon")
-    print("2. ✨ Generate a new Hackathon idea with AI")
-    print("3. Return to Main Menu")
+    print(f"1. Join '{hackathon.DEFAULT_HACKATHON}' Hackathon")
+    print("2. Submit a Solution")
+    print("3. View Live Scoreboard")
+    print("4. ✨ Generate a new Hackathon idea with AI")
+    print("5. Return to Main Menu")
     choice = input("Choice: ")
+    if choice in ('1', '2', '3'):
+        event = hackathon.get_hackathon_by_name(hackathon.DEFAULT_HACKATHON)
+        if not event:
+            print(f"{Colors.WARNING}The '{hackathon.DEFAULT_HACKATHON}' Hackathon hasn't been set up yet.{Colors.ENDC}")
+            return
+        team = hackathon.get_team_for_user(event['id'], current_user['name'])
+
     if choice == '1':
-        print(f"\n{Colors.GREEN}✅ You have joined the 'AI for Good' Hackathon!{Colors.ENDC}")
+        if team:
+            print(f"{Colors.WARNING}You're already on team '{team['name']}'.{Colors.ENDC}")
+            return
+        team_name = input("Team name to create or join: ").strip()
+        if not team_name:
+            print(f"{Colors.FAIL}Team name cannot be empty.{Colors.ENDC}")
+            return
+        if hackathon.join_team(event['id'], team_name, current_user['name']) is None:
+            # Another session joined this user to a different team in the meantime
+            team = hackathon.get_team_for_user(event['id'], current_user['name'])
+            print(f"{Colors.WARNING}You're already on team '{team['name']}'.{Colors.ENDC}")
+            return
+        print(f"\n{Colors.GREEN}✅ You have joined the '{event['name']}' Hackathon as part of team '{team_name}'!{Colors.ENDC}")
     elif choice == '2':
+        if not team:
+            print(f"{Colors.FAIL}Join a team first.{Colors.ENDC}")
+            return
+        problems = hackathon.get_problems(event['id'])
+        for problem in problems:
+            print(f"  {Colors.BOLD}{problem['label']}){Colors.ENDC} {problem['title']}")
+        label = input("Problem: ").strip().upper()
+        problem = next((p for p in problems if p['label'].upper() == label), None)
+        if not problem:
+            print(f"{Colors.FAIL}Invalid problem.{Colors.ENDC}")
+            return
+        print(f"\n{Colors.WARNING}{problem['title']}:{Colors.ENDC} {problem['statement']}")
+        lang = input("Language (python/java/c++): ").strip().lower()
+        if lang not in ('python', 'java', 'c++'):
+            print(f"{Colors.FAIL}Invalid language.{Colors.ENDC}")
+            return
+        print("Enter your code (end with a blank line). Read input from stdin:")
+        code = '\n'.join(line for line in iter(input, ''))
+        if not code:
+            return
+        submission_id = hackathon.submit(event['id'], team['id'], problem['id'], current_user['name'], lang, code)
+        if submission_id:
+            print(f"{Colors.GREEN}Submission #{submission_id} is queued for judging. Check the scoreboard for your verdict.{Colors.ENDC}")
+        else:
+            print(f"{Colors.FAIL}Submissions are closed: the hackathon isn't running right now.{Colors.ENDC}")
+    elif choice == '3':
+        print(f"\n{Colors.HEADER}=== 🏆 {event['name']} Scoreboard ==={Colors.ENDC}")
+        hackathon.print_scoreboard(event['id'])
+        if team:
+            print(f"\n{Colors.BOLD}Team '{team['name']}' recent submissions:{Colors.ENDC}")
+            for sub in hackathon.get_team_submissions(team['id']):
+                print(f"  #{sub['id']:<6}{sub['label']:<4}{sub['language']:<8}{sub['verdict'] or sub['status']}")
+    elif choice == '4':
         topic = input("What topic are you interested in? (e.g., 'healthcare', 'gaming'): ")
         prompt = f"Generate a single, creative hackathon challenge idea related to '{topic}'. Include a catchy name and a one-sentence problem statement."
         idea = call_gemini_api(prompt)
         print(f"\n{Colors.CYAN}--- AI-Generated Hackathon Idea ---\n{idea}{Colors.ENDC}")
 
 # --- Other Helper Functions ---
-def execute_code(code, language='python', check_code=None, current_user=None):
-    """BUG FIX: This version correctly handles execution and output for all languages."""
+# Run statuses that are decided by the code alone and may be cached
+CACHEABLE_STATUSES = ('ok', 'compile_error', 'runtime_error')
+
+def execute_code(code, language='python', check_code=None, current_user=None, with_usage=False):
+    """Runs user code, reusing the cached verdict when identical deterministic code ran before.
+
+    Returns (error, output), or (error, output, usage) when `with_usage` is set, where
+    usage holds the wall time, CPU time and peak RSS the run actually consumed.
+    """
     start = time.time()
-    error, output = None, ""
-    full_code = code + (f"\n{check_code}" if check_code else "")
+    user_name = current_user['name'] if current_user else None
+    if user_name:
+        verdict_cache.record_submission(language, code, user_name)
+
+    key = verdict_cache.cache_key(language, code, check_code)
+    cached = verdict_cache.lookup(key) if key else None
+    if cached:
+        error, output, usage = cached
+        usage = dict(usage or {}, cached=True)
+    else:
+        error, output, usage, status = governor.run_code(code, language, check_code, user_name)
+        if key and status in CACHEABLE_STATUSES:
+            verdict_cache.store(key, language, error, output, usage)
 
-    try:
-        if language == 'python':
-            result = subprocess.run([sys.executable, '-c', full_code], capture_output=True, text=True, timeout=5)
-            if result.returncode != 0: raise Exception(result.stderr)
-            output = result.stdout
-        elif language == 'java':
-            with tempfile.TemporaryDirectory() as tmpdir:
-                path = os.path.join(tmpdir, 'Main.java')
-                with open(path, 'w') as f: f.write(code)
-                cp = subprocess.run(['javac', path], capture_output=True, text=True, timeout=10)
-                if cp.returncode: raise Exception(cp.stderr)
-                rp = subprocess.run(['java', '-cp', tmpdir, 'Main'], capture_output=True, text=True, timeout=5)
-                if rp.returncode: raise Exception(rp.stderr)
-                output = rp.stdout
-        elif language == 'c++':
-            with tempfile.TemporaryDirectory() as tmpdir:
-                src = os.path.join(tmpdir, 'main.cpp')
-                exe = os.path.join(tmpdir, 'main.exe' if os.name == 'nt' else 'a.out')
-                with open(src, 'w') as f: f.write(code)
-                cp = subprocess.run(['g++', src, '-o', exe], capture_output=True, text=True, timeout=10)
-                if cp.returncode: raise Exception(cp.stderr)
-                rp = subprocess.run([exe], capture_output=True, text=True, timeout=5)
-                if rp.returncode: raise Exception(rp.stderr)
-                output = rp.stdout
-    except Exception as e:
-        error = str(e)
-    
     elapsed = time.time() - start
+    usage = dict(usage or {}, wall_time=elapsed)
 
     if error:
         print(f"{Colors.FAIL}Error: {error.strip()}{Colors.ENDC}")
@@ -363,20 +424,45 @@ def execute_code(code, language='python', check_code=None, current_user=None):
     if not check_code:
         if not error:
             gems_earned = random.randint(1, 5)
-            database.update_user_gems(current_user['name'], gems_earned)
+            database.update_user_gems(current_user['name'], gems_earned, skill=language)
             print(f"{Colors.GREEN}Success! You earned {gems_earned} 💎 gems.{Colors.ENDC}")
         
-        print(f"Time: {elapsed:.4f}s")
-        provide_ai_feedback(code, error, elapsed)
+        if usage.get('cached'):
+            print(f"Time: {elapsed:.4f}s (same code ran before; reused its verdict)")
+        elif 'cpu_time' in usage:
+            print(f"Time: {elapsed:.4f}s | CPU: {usage['cpu_time']:.4f}s | Peak memory: {usage['peak_rss_kb'] / 1024:.1f} MB")
+        else:
+            print(f"Time: {elapsed:.4f}s")
+        provide_ai_feedback(code, error, elapsed, current_user['name'])
             
+    if with_usage:
+        return error, output, usage
     return error, output
 
 # BUG FIX: Re-added the missing provide_ai_feedback function
-def provide_ai_feedback(code, error, elapsed):
-    prompt = f"Act as a coding mentor. Here's a user's code:\n\n{code}\n\nIt {'had an error: ' + error if error else 'ran successfully'} in {elapsed:.2f} seconds. Give one-line:\n- Compliment\n- Performance comment\n- Area of improvement (if any)"
-    feedback = call_gemini_api(prompt)
-    print(f"\n{Colors.CYAN}🤖 AI Feedback:{Colors.ENDC}")
-    print(feedback)
+def provide_ai_feedback(code, error, elapsed, user_name):
+    """Queues AI feedback for a run; it is shown at the user's next menu instead of blocking now."""
+    task_queue.enqueue('code_feedback', {'code': code, 'error': error, 'elapsed': round(elapsed, 2)},
+                       user_name=user_name, priority=10)
+
+# --- Background AI Jobs (run by task_queue workers) ---
+def _code_feedback_job(payload):
+    error = payload['error']
+    prompt = f"Act as a coding mentor. Here's a user's code:\n\n{payload['code']}\n\nIt {'had an error: ' + error if error else 'ran successfully'} in {payload['elapsed']:.2f} seconds. Give one-line:\n- Compliment\n- Performance comment\n- Area of improvement (if any)"
+    return call_gemini_api(prompt, retries=1, quiet=True)
+
+def _dashboard_summary_job(payload):
+    prompt = f"User has {payload['gems']} gems, badge {payload['badge']}, skill {payload['skill']}. Give a short motivational summary."
+    return call_gemini_api(prompt, retries=1, quiet=True)
+
+def _leaderboard_praise_job(payload):
+    prompt = f"Give a cool 1-liner praise for coder '{payload['top_user']}' who topped the leaderboard."
+    comment = call_gemini_api(prompt, retries=1, quiet=True)
+    return f"{payload['top_user']}: {comment}" if comment else None
+
+task_queue.register_handler('code_feedback', "🤖 AI Feedback", _code_feedback_job)
+task_queue.register_handler('dashboard_summary', "🤖 AI Summary", _dashboard_summary_job)
+task_queue.register_handler('leaderboard_praise', "👑 AI Praise", _leaderboard_praise_job)
 
 def calculate_badge(gems):
     """Helper function with expanded badge tiers."""
@@ -5,48 +5,28 @@ import sqlite3
 from datetime import date, timedelta
 import json
 
+import migrations
+
+DB_FILE = "mavericks.db"
+
+# --- Leaderboard Rollups ---
+# Gems are also tallied into small per-period, per-skill rollup rows as they are
+# earned, so every leaderboard variant is a single indexed read.
+LEADERBOARD_PERIODS = ('daily', 'weekly', 'all')
+ALL_SKILLS = '*' # Partition key for the "every language" leaderboards
+DAILY_WINDOWS_KEPT = 7 # How many days of daily rollups to keep around
+WEEKLY_WINDOWS_KEPT = 8 # How many weeks of weekly rollups to keep around
+
 def get_db_connection():
     """Establishes and returns a connection to the database."""
-    conn = sqlite3.connect("mavericks.db", check_same_thread=False)
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
     # This allows accessing columns by name, which is much cleaner
     conn.row_factory = sqlite3.Row 
     return conn
 
 def setup_database():
-    """Sets up the database tables and adds new columns if they don't exist."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT UNIQUE,
-        password TEXT,
-        skill TEXT,
-        gems INTEGER DEFAULT 0,
-        badge TEXT DEFAULT 'Newbie',
-        streak INTEGER DEFAULT 0,
-        last_login TEXT DEFAULT CURRENT_DATE,
-        last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        assessment_scores TEXT,
-        resume_text TEXT
-    )
-    ''')
-    
-    # Safely add columns if they don't exist to avoid errors on subsequent runs
-    try:
-        cursor.execute("ALTER TABLE users ADD COLUMN assessment_scores TEXT")
-    except sqlite3.OperationalError: pass
-    try:
-        cursor.execute("ALTER TABLE users ADD COLUMN resume_text TEXT")
-    except sqlite3.OperationalError: pass
-    try:
-        cursor.execute("ALTER TABLE users ADD COLUMN gems INTEGER DEFAULT 0")
-    except sqlite3.OperationalError: pass
-
-
-    conn.commit()
-    conn.close()
+    """Brings the database schema up to date. Costs one version check when it already is."""
+    migrations.migrate(DB_FILE)
 
 def create_user(name, password, skill):
     """Creates a new user in the database."""
@@ -105,13 +85,57 @@ def update_login_streak(name):
         conn.commit()
     conn.close()
 
-def update_user_gems(name, gems_to_add):
-    """Adds a specified number of gems to a user's account."""
+def leaderboard_period_start(period, day=None):
+    """Returns the key of the window that `day` falls in for a leaderboard period."""
+    day = day or date.today()
+    if period == 'daily':
+        return str(day)
+    if period == 'weekly':
+        return str(day - timedelta(days=day.weekday())) # Weeks start on Monday
+    return ''
+
+def update_user_gems(name, gems_to_add, skill=None):
+    """Adds gems to a user's account and to the matching leaderboard rollups.
+
+    `skill` is the language the gems were earned in; it defaults to the user's primary skill.
+    """
     conn = get_db_connection()
-    conn.cursor().execute("UPDATE users SET gems = gems + ? WHERE name=?", (gems_to_add, name))
+    cursor = conn.cursor()
+    cursor.execute("UPDATE users SET gems = gems + ? WHERE name=?", (gems_to_add, name))
+    if skill is None:
+        row = cursor.execute("SELECT skill FROM users WHERE name=?", (name,)).fetchone()
+        skill = row['skill'] if row else None
+
+    today = date.today()
+    rollups = []
+    for period in LEADERBOARD_PERIODS:
+        start = leaderboard_period_start(period, today)
+        if skill:
+            rollups.append((period, start, skill.lower(), name, gems_to_add))
+        if period != 'all': # The all-time global board reads straight from users.gems
+            rollups.append((period, start, ALL_SKILLS, name, gems_to_add))
+    cursor.executemany('''
+    INSERT INTO leaderboard_rollups (period, period_start, skill, user_name, gems) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (period, period_start, skill, user_name) DO UPDATE SET gems = gems + excluded.gems
+    ''', rollups)
     conn.commit()
     conn.close()
 
+def expire_leaderboard_windows(today=None):
+    """Drops daily and weekly rollup rows that have fallen out of their retention window."""
+    today = today or date.today()
+    oldest_day = str(today - timedelta(days=DAILY_WINDOWS_KEPT - 1))
+    oldest_week = leaderboard_period_start('weekly', today - timedelta(weeks=WEEKLY_WINDOWS_KEPT - 1))
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM leaderboard_rollups WHERE period='daily' AND period_start < ?", (oldest_day,))
+    expired = cursor.rowcount
+    cursor.execute("DELETE FROM leaderboard_rollups WHERE period='weekly' AND period_start < ?", (oldest_week,))
+    expired += cursor.rowcount
+    conn.commit()
+    conn.close()
+    return expired
+
 def update_user_badge(name, new_badge):
     """Updates a user's badge in the database."""
     conn = get_db_connection()
@@ -145,9 +169,21 @@ def update_resume_text(name, text):
     conn.commit()
     conn.close()
 
-def get_leaderboard_data():
-    """Fetches the top 10 users for the leaderboard, ordered by gems."""
+def get_leaderboard_data(period='all', skill=None, limit=10):
+    """Fetches the top users for a leaderboard, ordered by gems.
+
+    `period` is one of LEADERBOARD_PERIODS and `skill` narrows the board to one language.
+    """
     conn = get_db_connection()
-    users = conn.cursor().execute("SELECT name, skill, gems, badge FROM users ORDER BY gems DESC LIMIT 10").fetchall()
+    cursor = conn.cursor()
+    if period == 'all' and not skill:
+        users = cursor.execute("SELECT name, skill, gems, badge FROM users ORDER BY gems DESC LIMIT ?", (limit,)).fetchall()
+    else:
+        users = cursor.execute('''
+        SELECT r.user_name AS name, u.skill, r.gems, u.badge
+        FROM leaderboard_rollups r JOIN users u ON u.name = r.user_name
+        WHERE r.period=? AND r.period_start=? AND r.skill=?
+        ORDER BY r.gems DESC LIMIT ?
+        ''', (period, leaderboard_period_start(period), skill.lower() if skill else ALL_SKILLS, limit)).fetchall()
     conn.close()
     return users
@@ -3,6 +3,8 @@
 
 import sqlite3
 
+import verdict_cache
+
 DB_FILE = "mavericks.db"
 
 def get_db_connection():
@@ -47,6 +49,7 @@ def delete_user_by_name():
     if user:
         # If the user exists, proceed with deletion
         cursor.execute("DELETE FROM users WHERE name=?", (name_to_delete,))
+        cursor.execute("DELETE FROM leaderboard_rollups WHERE user_name=?", (name_to_delete,))
         conn.commit()
         print(f"\nSuccessfully deleted user '{name_to_delete}'.")
     else:
@@ -54,13 +57,29 @@ def delete_user_by_name():
         
     conn.close()
 
+def list_duplicate_submissions():
+    """Prints code fingerprints that more than one user has submitted."""
+    rows = verdict_cache.get_shared_fingerprints()
+
+    print("\n--- Code Submitted by Several Users ---")
+    if not rows:
+        print("No duplicate submissions found.")
+        return
+
+    print(f"{'Fingerprint':<14}{'Language':<10}{'Users':<7}{'Names'}")
+    print("-" * 60)
+    for row in rows:
+        print(f"{row['fingerprint'][:12]:<14}{row['language']:<10}{row['users']:<7}{row['user_names']}")
+    print("-" * 60)
+
 def main_menu():
     """Displays the main menu and handles user input."""
     while True:
         print("\n--- Mavericks Database Manager ---")
         print("1. List All Users")
         print("2. Delete a User by Name")
-        print("3. Exit")
+        print("3. List Duplicate Submissions")
+        print("4. Exit")
         choice = input("Enter your choice: ")
 
         if choice == '1':
@@ -68,6 +87,8 @@ def main_menu():
         elif choice == '2':
             delete_user_by_name()
         elif choice == '3':
+            list_duplicate_submissions()
+        elif choice == '4':
             print("Exiting database manager.")
             break
         else:
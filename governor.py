@@ -0,0 +1,431 @@
+# governor.py
+# Keeps user code from starving the host: per-run resource limits, resource
+# accounting, an admission queue that caps how many programs run at once, and
+# the compile-and-run steps for each language built on top of them.
+
+import hashlib
+import itertools
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from contextlib import closing, contextmanager
+
+# rlimits and per-child rusage are POSIX-only; on Windows runs fall back to a plain timeout
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Host-wide run slots are flock()ed files; without fcntl (Windows) admission is per process only
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# --- Configuration ---
+# Limits per execution stage; None leaves that resource unlimited.
+STAGE_LIMITS = {
+    'compile': {'cpu_seconds': 20, 'address_space_mb': 2048, 'extra_processes': 64, 'file_size_mb': 64},
+    'run': {'cpu_seconds': 5, 'address_space_mb': 256, 'extra_processes': 32, 'file_size_mb': 16},
+}
+# The JVM reserves far more virtual memory than it uses, so Java is capped through its heap instead
+LANGUAGE_LIMITS = {
+    'java': {'address_space_mb': None},
+}
+JAVA_MAX_HEAP = '-Xmx256m'
+MAX_OUTPUT_BYTES = 1024 * 1024 # Anything a program prints past this is discarded
+
+RUNS_PER_CORE = 1 # Concurrent executions allowed per CPU core
+RUNS_PER_USER = 2 # Concurrent executions allowed per user
+# Every main.py, judge worker and load-test session on the host shares the slots in this directory
+SLOT_DIR = os.getenv('MAVERICKS_RUN_SLOT_DIR') or os.path.join(
+    tempfile.gettempdir(), f"mavericks-run-slots-{os.getuid() if hasattr(os, 'getuid') else 0}")
+SLOT_POLL_SECONDS = 0.02 # How often a waiting run retries the host slots
+
+def get_limits(stage, language=None):
+    """Returns the resource limits for a stage ('compile' or 'run') of a language."""
+    limits = dict(STAGE_LIMITS[stage])
+    limits.update(LANGUAGE_LIMITS.get(language, {}))
+    return limits
+
+# --- Resource Limits ---
+def _user_task_count():
+    """Tasks (threads included) owned by our real uid, which is what RLIMIT_NPROC counts."""
+    try:
+        pids = [name for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return None # No /proc (macOS): the process cap is skipped
+    uid, total = os.getuid(), 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                fields = dict(line.split(':', 1) for line in f if ':' in line)
+            if int(fields['Uid'].split()[0]) == uid:
+                total += int(fields.get('Threads', 1))
+        except (OSError, KeyError, ValueError):
+            continue # Exited while we were looking
+    return total
+
+# Runs in a fresh interpreter between Popen and the real program (preexec_fn isn't safe while
+# other threads, such as AI workers or the judge pool, are running). It forks the program,
+# applies the limits passed as NAME=VALUE pairs in the child, and exits the way the program did.
+# Because the program is forked from this small interpreter rather than from the app, its
+# rusage shows only its own peak memory; it is written to the report fd as "utime stime maxrss".
+_LIMIT_WRAPPER = """
+import os, resource, signal, sys
+report_fd, spec, cmd = int(sys.argv[1]), sys.argv[2], sys.argv[3:]
+pid = os.fork()
+if pid == 0:
+    os.close(report_fd)
+    for item in filter(None, spec.split(',')):
+        name, value = item.split('=')
+        try:
+            resource.setrlimit(getattr(resource, name), (int(value), int(value)))
+        except (ValueError, OSError):
+            pass # Never raise the hard limit; keep whatever is stricter
+    try:
+        os.execvp(cmd[0], cmd)
+    except OSError as e:
+        os.write(2, f"{cmd[0]}: {e.strerror}\\n".encode())
+        os._exit(127)
+_, status, usage = os.wait4(pid, 0)
+os.write(report_fd, f"{usage.ru_utime} {usage.ru_stime} {usage.ru_maxrss}".encode())
+if os.WIFSIGNALED(status):
+    try:
+        signal.signal(os.WTERMSIG(status), signal.SIG_DFL)
+    except (OSError, ValueError):
+        pass # SIGKILL can't be caught, so it already has its default action
+    os.kill(os.getpid(), os.WTERMSIG(status))
+os._exit(os.WEXITSTATUS(status) if os.WIFEXITED(status) else 1)
+"""
+
+def _limit_spec(limits):
+    """Encodes `limits` as the wrapper's NAME=VALUE argument."""
+    caps = []
+    if limits.get('cpu_seconds') is not None:
+        caps.append(('RLIMIT_CPU', limits['cpu_seconds']))
+    if limits.get('address_space_mb') is not None:
+        caps.append(('RLIMIT_AS', limits['address_space_mb'] * 1024 * 1024))
+    if limits.get('file_size_mb') is not None:
+        caps.append(('RLIMIT_FSIZE', limits['file_size_mb'] * 1024 * 1024))
+    # RLIMIT_NPROC counts every task of our uid, not just this run's, so it is set relative
+    # to what the uid already runs. Other runs starting at the same moment share the headroom.
+    if limits.get('extra_processes') is not None and hasattr(resource, 'RLIMIT_NPROC'):
+        tasks = _user_task_count()
+        if tasks is not None:
+            caps.append(('RLIMIT_NPROC', tasks + limits['extra_processes']))
+    return ','.join(f"{name}={value}" for name, value in caps)
+
+def _drain(pipe, chunks):
+    """Reads a pipe to EOF, keeping at most MAX_OUTPUT_BYTES of it."""
+    kept = 0
+    while True:
+        chunk = pipe.read(65536)
+        if not chunk:
+            break
+        if kept < MAX_OUTPUT_BYTES:
+            chunks.append(chunk[:MAX_OUTPUT_BYTES - kept])
+            kept += len(chunks[-1])
+    pipe.close()
+
+def _feed(pipe, text):
+    """Writes a program's stdin and closes it; a program that stops reading early is fine."""
+    try:
+        pipe.write(text)
+        pipe.close()
+    except (BrokenPipeError, OSError):
+        pass
+
+def run_limited(cmd, stage='run', language=None, timeout=5, cwd=None, input_text=None):
+    """Runs a command under the stage's resource limits, feeding it `input_text` on stdin if given.
+
+    Returns (CompletedProcess, usage) where usage is a dict with 'cpu_time' (seconds)
+    and 'peak_rss_kb', or None where the platform can't measure them.
+    Raises subprocess.TimeoutExpired like subprocess.run does.
+    """
+    # A fixed hash seed keeps Python's set and dict-of-str ordering the same on every run
+    env = dict(os.environ, PYTHONHASHSEED='0')
+    if resource is None or not hasattr(os, 'wait4'):
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, cwd=cwd, env=env,
+                                input=input_text, stdin=None if input_text is not None else subprocess.DEVNULL)
+        return result, None
+
+    if os.sep not in cmd[0] and shutil.which(cmd[0]) is None:
+        # Fail like Popen would, rather than as a non-zero exit from the wrapper
+        raise FileNotFoundError(f"No such file or directory: '{cmd[0]}'")
+    report_read, report_write = os.pipe()
+    wrapped = [sys.executable, '-I', '-S', '-c', _LIMIT_WRAPPER, str(report_write),
+               _limit_spec(get_limits(stage, language))] + list(cmd)
+    try:
+        proc = subprocess.Popen(wrapped, stdin=subprocess.DEVNULL if input_text is None else subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, pass_fds=(report_write,),
+                                text=True, errors='replace', cwd=cwd, env=env, start_new_session=True)
+    except Exception:
+        os.close(report_read)
+        raise
+    finally:
+        os.close(report_write)
+    out, err = [], []
+    readers = [threading.Thread(target=_drain, args=(proc.stdout, out), daemon=True),
+               threading.Thread(target=_drain, args=(proc.stderr, err), daemon=True)]
+    if input_text is not None:
+        readers.append(threading.Thread(target=_feed, args=(proc.stdin, input_text), daemon=True))
+    for reader in readers:
+        reader.start()
+
+    timed_out = threading.Event()
+    def kill_group():
+        timed_out.set()
+        try:
+            os.killpg(proc.pid, signal.SIGKILL) # The whole session, including anything it forked
+        except ProcessLookupError:
+            pass
+    timer = threading.Timer(timeout, kill_group)
+    timer.start()
+    try:
+        if hasattr(os, 'waitid'):
+            # Wait without reaping, so the group id can't be recycled before stragglers are killed
+            os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+            try:
+                os.killpg(proc.pid, signal.SIGKILL) # Anything it left behind still holding the pipes
+            except (ProcessLookupError, PermissionError):
+                pass
+        # wait4 reaps the wrapper; its rusage is the fallback if the program's report is missing
+        _, status, rusage = os.wait4(proc.pid, 0)
+    finally:
+        timer.cancel()
+        with os.fdopen(report_read, 'rb') as report:
+            reported = report.read().split()
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    for reader in readers:
+        reader.join()
+
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    if len(reported) == 3:
+        cpu_time, max_rss = float(reported[0]) + float(reported[1]), int(reported[2])
+    else:
+        cpu_time, max_rss = rusage.ru_utime + rusage.ru_stime, rusage.ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    peak_rss_kb = max_rss // 1024 if sys.platform == 'darwin' else max_rss
+    usage = {'cpu_time': cpu_time, 'peak_rss_kb': peak_rss_kb}
+    return subprocess.CompletedProcess(cmd, proc.returncode, ''.join(out), ''.join(err)), usage
+
+def merge_usage(total, usage):
+    """Folds one stage's usage into a running total: CPU adds up, peak RSS is the max."""
+    if usage is None:
+        return total
+    if total is None:
+        return dict(usage)
+    return {'cpu_time': total['cpu_time'] + usage['cpu_time'],
+            'peak_rss_kb': max(total['peak_rss_kb'], usage['peak_rss_kb'])}
+
+# --- Admission Control ---
+class _HostSlots:
+    """Run slots shared by every process on the host, held as flock()ed files in one directory.
+
+    A run holds one of its user's slot files and one of the host's. Locks die with their
+    process, so a crashed session never leaks a slot.
+    """
+
+    def __init__(self, directory, total, per_user):
+        self.directory = directory
+        self.total = total
+        self.per_user = per_user
+
+    def _lock_first_free(self, names):
+        """Locks the first free file of `names`. Returns (index, fd), or (None, None) if all are held."""
+        for index, name in enumerate(names):
+            fd = os.open(os.path.join(self.directory, name), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return index, fd
+            except OSError:
+                os.close(fd)
+        return None, None
+
+    def acquire(self, user):
+        """Blocks until `user` holds a user slot and a host slot. Returns the fds to release."""
+        key = hashlib.sha1(str(user).encode()).hexdigest()[:16]
+        user_slots = [f"user-{key}-{i}" for i in range(self.per_user)]
+        host_slots = [f"slot-{i}" for i in range(self.total)]
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        except OSError:
+            return [] # Can't share slots; the per-process caps still apply
+        held = []
+        try:
+            while True:
+                if not held:
+                    # The index is how many of this user's runs were already in progress
+                    rank, fd = self._lock_first_free(user_slots)
+                    if fd is not None:
+                        held.append(fd)
+                if held:
+                    _, fd = self._lock_first_free(host_slots)
+                    if fd is not None:
+                        held.append(fd)
+                        return held
+                # Users with fewer runs in progress retry sooner, so freed slots go to them first
+                time.sleep(SLOT_POLL_SECONDS * (1 + (rank if held else self.per_user)))
+        except BaseException:
+            self.release(held)
+            raise
+
+    def release(self, held):
+        for fd in held:
+            os.close(fd) # Closing drops the lock
+
+class AdmissionController:
+    """Caps concurrent executions overall and per user, across every process on the host.
+
+    Within a process, a freed slot goes to the waiting user with the fewest runs in
+    progress, oldest request first, so one busy user can't crowd out the rest. Between
+    processes the same caps hold through host-wide slot files (see _HostSlots).
+    """
+
+    def __init__(self, max_concurrent=None, per_user=RUNS_PER_USER, slot_dir=SLOT_DIR):
+        self.max_concurrent = max_concurrent or (os.cpu_count() or 1) * RUNS_PER_CORE
+        self.per_user = per_user
+        self._host = _HostSlots(slot_dir, self.max_concurrent, per_user) if fcntl and slot_dir else None
+        self._cond = threading.Condition()
+        self._running = {} # user -> executions in progress
+        self._total = 0
+        self._waiting = [] # (ticket, user) in arrival order
+        self._tickets = itertools.count()
+
+    def _next_up(self):
+        if self._total >= self.max_concurrent:
+            return None
+        candidates = [w for w in self._waiting if self._running.get(w[1], 0) < self.per_user]
+        return min(candidates, key=lambda w: (self._running.get(w[1], 0), w[0]), default=None)
+
+    @contextmanager
+    def admit(self, user):
+        """Blocks until `user` may start an execution, and holds the slot for the with-block."""
+        with self._cond:
+            me = (next(self._tickets), user)
+            self._waiting.append(me)
+            while self._next_up() is not me:
+                self._cond.wait()
+            self._waiting.remove(me)
+            self._running[user] = self._running.get(user, 0) + 1
+            self._total += 1
+            self._cond.notify_all() # Another waiter may also be eligible now
+        held = []
+        try:
+            if self._host:
+                held = self._host.acquire(user) # Other sessions on the host count too
+            yield
+        finally:
+            if held:
+                self._host.release(held)
+            with self._cond:
+                self._running[user] -= 1
+                if not self._running[user]:
+                    del self._running[user]
+                self._total -= 1
+                self._cond.notify_all()
+
+    def stats(self):
+        """Returns a snapshot of running and waiting executions."""
+        with self._cond:
+            return {'running': self._total, 'waiting': len(self._waiting), 'per_user': dict(self._running)}
+
+# Shared by every execute_code call in this process
+admission = AdmissionController()
+
+# --- Running Code ---
+# How a run ended. Only 'ok', 'compile_error' and 'runtime_error' are decided by the code alone.
+RUN_STATUSES = ('ok', 'compile_error', 'runtime_error', 'crashed', 'time_limit', 'internal_error')
+
+class _RunFailed(Exception):
+    """A compile or run step exited non-zero; the message is its stderr."""
+    def __init__(self, result, stage):
+        super().__init__(result.stderr)
+        if stage == 'compile':
+            self.status = 'compile_error'
+        elif result.returncode < 0:
+            # SIGXCPU/SIGKILL come from the CPU limit; other signals are crashes (segfaults etc.)
+            limit_signals = (getattr(signal, 'SIGXCPU', None), getattr(signal, 'SIGKILL', None))
+            self.status = 'time_limit' if -result.returncode in limit_signals else 'crashed'
+        else:
+            self.status = 'runtime_error'
+
+def _check_step(result, stage='run'):
+    if result.returncode: raise _RunFailed(result, stage)
+
+def _failure(error, usage):
+    """Turns an exception from a compile or run step into an (error, output, usage, status) result."""
+    if isinstance(error, _RunFailed):
+        status = error.status
+    elif isinstance(error, subprocess.TimeoutExpired):
+        status = 'time_limit'
+    else:
+        status = 'internal_error'
+    return str(error), "", usage, status
+
+def _build(code, language, workdir):
+    """Compiles code into `workdir` if the language needs it. Returns (run command, compile usage)."""
+    if language == 'python':
+        # Syntax errors are compile errors, as they are for Java and C++ (and cost no penalty)
+        try:
+            compile(code, '<submission>', 'exec')
+        except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+            message = ''.join(traceback.format_exception_only(type(e), e))
+            raise _RunFailed(subprocess.CompletedProcess(['compile'], 1, '', message), 'compile')
+        return [sys.executable, '-c', code], None
+    if language == 'java':
+        path = os.path.join(workdir, 'Main.java')
+        with open(path, 'w') as f: f.write(code)
+        result, usage = run_limited(['javac', '-J' + JAVA_MAX_HEAP, path], 'compile', language, timeout=10)
+        _check_step(result, 'compile')
+        return ['java', JAVA_MAX_HEAP, '-cp', workdir, 'Main'], usage
+    if language == 'c++':
+        src = os.path.join(workdir, 'main.cpp')
+        exe = os.path.join(workdir, 'main.exe' if os.name == 'nt' else 'a.out')
+        with open(src, 'w') as f: f.write(code)
+        result, usage = run_limited(['g++', src, '-o', exe], 'compile', language, timeout=10)
+        _check_step(result, 'compile')
+        return [exe], usage
+    raise ValueError(f"Unsupported language: {language}")
+
+def run_batch(code, language, inputs, user_name=None):
+    """Compiles code once, then runs it on each of `inputs` (stdin text or None), in one admission slot.
+
+    Yields (error, output, usage, status) per input, where status is one of RUN_STATUSES;
+    a compile error is yielded once and ends the batch. The first result's usage includes
+    the compile step. Close the generator early to give the slot back.
+    """
+    with admission.admit(user_name), tempfile.TemporaryDirectory() as workdir:
+        try:
+            cmd, usage = _build(code, language, workdir)
+        except Exception as e:
+            yield _failure(e, None)
+            return
+        for input_text in inputs:
+            try:
+                result, run_usage = run_limited(cmd, 'run', language, timeout=5, input_text=input_text)
+                usage = merge_usage(usage, run_usage)
+                _check_step(result)
+            except Exception as e:
+                yield _failure(e, usage)
+            else:
+                yield None, result.stdout, usage, 'ok'
+            usage = None # Compile usage is only counted once
+
+def run_code(code, language='python', check_code=None, user_name=None, input_text=None):
+    """Compiles and runs code under the governor's limits and admission queue.
+
+    Returns (error, output, usage, status) where status is one of RUN_STATUSES.
+    `input_text` is fed to the program's stdin.
+    """
+    full_code = code + (f"\n{check_code}" if check_code and language == 'python' else "")
+    with closing(run_batch(full_code, language, [input_text], user_name)) as runs:
+        return next(runs)
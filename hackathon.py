@@ -0,0 +1,444 @@
+# hackathon.py
+# Hackathon judging engine: teams, submissions judged against hidden tests in
+# parallel, and an ICPC-style scoreboard that is updated one cell at a time as
+# verdicts arrive. Organizers load contests from JSON:
+#
+#   python hackathon.py load contest.json
+#   python hackathon.py scoreboard "AI for Good"
+
+import argparse
+import functools
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+
+from config import Colors
+import database
+import governor
+
+DEFAULT_HACKATHON = 'AI for Good'
+# 'local' judges in this process; 'cluster' leaves submissions for judge_cluster.py workers
+JUDGE_MODE = os.getenv('MAVERICKS_JUDGE_MODE', 'local')
+
+# Verdicts: AC accepted, WA wrong answer, RE runtime error, TLE time limit, CE compile error, IE internal error
+STATUS_VERDICTS = {'compile_error': 'CE', 'runtime_error': 'RE', 'crashed': 'RE', 'time_limit': 'TLE', 'internal_error': 'IE'}
+PENALIZED_VERDICTS = ('WA', 'RE', 'TLE') # CE and IE cost nothing, as in ICPC
+
+# Local judging leases each submission to this process, so other sessions on the same
+# database leave it alone and only pick it up if this process dies mid-judging
+LOCAL_OWNER = f"local:{socket.gethostname()}:{os.getpid()}"
+LOCAL_LEASE_SECONDS = 60
+LOCAL_RENEW_SECONDS = 15
+
+_pool = None
+_pool_lock = threading.Lock()
+_judging = set() # Submission ids this process is judging right now
+
+# --- Organizer Functions ---
+def _insert_hackathon(cursor, name, starts_at, ends_at, penalty_minutes):
+    cursor.execute("INSERT INTO hackathons (name, starts_at, ends_at, penalty_minutes) VALUES (?, ?, ?, ?)",
+                   (name, starts_at, ends_at, penalty_minutes))
+    return cursor.lastrowid
+
+def _insert_problem(cursor, hackathon_id, label, title, statement, tests):
+    cursor.execute("INSERT INTO hackathon_problems (hackathon_id, label, title, statement) VALUES (?, ?, ?, ?)",
+                   (hackathon_id, label, title, statement))
+    problem_id = cursor.lastrowid
+    cursor.executemany("INSERT INTO hackathon_tests (problem_id, input, expected_output) VALUES (?, ?, ?)",
+                       [(problem_id, test_input, expected) for test_input, expected in tests])
+    return problem_id
+
+def create_hackathon(name, starts_at, ends_at, penalty_minutes=20):
+    """Creates a hackathon running between two Unix timestamps. Returns its id."""
+    conn = database.get_db_connection()
+    hackathon_id = _insert_hackathon(conn.cursor(), name, starts_at, ends_at, penalty_minutes)
+    conn.commit()
+    conn.close()
+    return hackathon_id
+
+def add_problem(hackathon_id, label, title, statement, tests):
+    """Adds a problem with its hidden tests, a list of (input, expected_output) pairs. Returns its id."""
+    conn = database.get_db_connection()
+    problem_id = _insert_problem(conn.cursor(), hackathon_id, label, title, statement, tests)
+    conn.commit()
+    conn.close()
+    return problem_id
+
+def load_hackathon(path):
+    """Creates a hackathon and its problems from a JSON file, all or nothing.
+
+    Expected keys: name, starts_at and ends_at (ISO 8601), optional penalty_minutes, and
+    problems, each with label, title, statement and tests ([{input, expected_output}]).
+    Returns the hackathon id, or None if a hackathon with that name already exists.
+    Raises KeyError or ValueError for a malformed file, before anything is written.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    # Read the whole file first, so a bad problem can't leave a half-created contest behind
+    starts_at = datetime.fromisoformat(spec['starts_at']).timestamp()
+    ends_at = datetime.fromisoformat(spec['ends_at']).timestamp()
+    problems = [(problem['label'], problem['title'], problem.get('statement', ''),
+                 [(test.get('input', ''), test['expected_output']) for test in problem['tests']])
+                for problem in spec['problems']]
+
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    try:
+        hackathon_id = _insert_hackathon(cursor, spec['name'], starts_at, ends_at, spec.get('penalty_minutes', 20))
+        for label, title, statement, tests in problems:
+            _insert_problem(cursor, hackathon_id, label, title, statement, tests)
+        conn.commit()
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        if get_hackathon_by_name(spec['name']) is None:
+            raise # Not a duplicate name (e.g. two problems share a label)
+        return None
+    finally:
+        conn.close()
+    return hackathon_id
+
+def get_hackathon_by_name(name):
+    """Fetches a hackathon by name."""
+    conn = database.get_db_connection()
+    row = conn.cursor().execute("SELECT * FROM hackathons WHERE name=?", (name,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def get_problems(hackathon_id):
+    """Fetches a hackathon's problems in label order."""
+    conn = database.get_db_connection()
+    rows = conn.cursor().execute("SELECT id, label, title, statement FROM hackathon_problems WHERE hackathon_id=? ORDER BY label",
+                                 (hackathon_id,)).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+@functools.lru_cache(maxsize=256)
+def get_tests(problem_id):
+    """Fetches a problem's hidden tests as (input, expected_output) pairs."""
+    # Tests don't change during a contest; a burst of submissions reads them once
+    conn = database.get_db_connection()
+    rows = conn.cursor().execute("SELECT input, expected_output FROM hackathon_tests WHERE problem_id=? ORDER BY id",
+                                 (problem_id,)).fetchall()
+    conn.close()
+    return tuple((row['input'], row['expected_output']) for row in rows)
+
+# --- Teams ---
+def join_team(hackathon_id, team_name, user_name):
+    """Adds a user to a team, creating the team if needed.
+
+    Returns the team id, or None if the user is already on a different team.
+    """
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    member = cursor.execute("SELECT team_id FROM hackathon_members WHERE hackathon_id=? AND user_name=?",
+                            (hackathon_id, user_name)).fetchone()
+    team = cursor.execute("SELECT id FROM hackathon_teams WHERE hackathon_id=? AND name=?", (hackathon_id, team_name)).fetchone()
+    if member:
+        conn.close()
+        return member['team_id'] if team and team['id'] == member['team_id'] else None
+
+    if team:
+        team_id = team['id']
+    else:
+        # A teammate may be creating the same team right now; whichever insert lands first wins
+        cursor.execute("INSERT OR IGNORE INTO hackathon_teams (hackathon_id, name) VALUES (?, ?)", (hackathon_id, team_name))
+        team_id = cursor.execute("SELECT id FROM hackathon_teams WHERE hackathon_id=? AND name=?",
+                                 (hackathon_id, team_name)).fetchone()['id']
+        # Teams are on the scoreboard from the start, with nothing solved
+        cursor.execute("INSERT OR IGNORE INTO hackathon_scoreboard (hackathon_id, team_id) VALUES (?, ?)", (hackathon_id, team_id))
+    # The same user joining from two sessions at once keeps whichever team got there first
+    cursor.execute("INSERT OR IGNORE INTO hackathon_members (hackathon_id, user_name, team_id) VALUES (?, ?, ?)",
+                   (hackathon_id, user_name, team_id))
+    member = cursor.execute("SELECT team_id FROM hackathon_members WHERE hackathon_id=? AND user_name=?",
+                            (hackathon_id, user_name)).fetchone()
+    conn.commit()
+    conn.close()
+    return team_id if member['team_id'] == team_id else None
+
+def get_team_for_user(hackathon_id, user_name):
+    """Returns the user's team as a dict with id and name, or None."""
+    conn = database.get_db_connection()
+    row = conn.cursor().execute('''
+    SELECT t.id, t.name FROM hackathon_members m JOIN hackathon_teams t ON t.id = m.team_id
+    WHERE m.hackathon_id=? AND m.user_name=?
+    ''', (hackathon_id, user_name)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+# --- Submissions and Judging ---
+def _judge_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # The governor's admission queue still decides how many actually run at once
+            _pool = ThreadPoolExecutor(max_workers=governor.admission.max_concurrent, thread_name_prefix='judge')
+            threading.Thread(target=_renew_local_leases, name='judge-leases', daemon=True).start()
+        return _pool
+
+def _renew_local_leases():
+    """Keeps this process's leases alive while it is judging; one write per interval, only when busy."""
+    while True:
+        time.sleep(LOCAL_RENEW_SECONDS)
+        with _pool_lock:
+            busy = bool(_judging)
+        if busy:
+            conn = database.get_db_connection()
+            conn.cursor().execute("UPDATE hackathon_submissions SET lease_expires=? WHERE worker_id=? AND status='judging'",
+                                  (time.time() + LOCAL_LEASE_SECONDS, LOCAL_OWNER))
+            conn.commit()
+            conn.close()
+
+def _claim(submission_id):
+    """Leases a submission to this process unless someone else holds a live lease on it."""
+    now = time.time()
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+    UPDATE hackathon_submissions SET status='judging', worker_id=?, lease_expires=?
+    WHERE id=? AND (status='pending' OR (status='judging' AND (lease_expires IS NULL OR lease_expires < ?)))
+    ''', (LOCAL_OWNER, now + LOCAL_LEASE_SECONDS, submission_id, now))
+    conn.commit()
+    conn.close()
+    return cursor.rowcount == 1
+
+def submit(hackathon_id, team_id, problem_id, user_name, language, code):
+    """Stores a submission and queues it for judging. Returns its id, or None outside the contest window."""
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    hackathon = cursor.execute("SELECT starts_at, ends_at FROM hackathons WHERE id=?", (hackathon_id,)).fetchone()
+    now = time.time()
+    if not hackathon or not hackathon['starts_at'] <= now <= hackathon['ends_at']:
+        conn.close()
+        return None
+    cursor.execute('''
+    INSERT INTO hackathon_submissions (hackathon_id, team_id, problem_id, user_name, language, code, submitted_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (hackathon_id, team_id, problem_id, user_name, language, code, now))
+    submission_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    if JUDGE_MODE == 'local':
+        _judge_pool().submit(judge_submission, submission_id)
+    return submission_id
+
+def _same_output(actual, expected):
+    # Trailing whitespace on lines and at the end is never significant
+    def normalize(text):
+        return '\n'.join(line.rstrip() for line in (text or '').strip().splitlines())
+    return normalize(actual) == normalize(expected)
+
+def judge_code(code, language, tests, fair_share_key=None, cancel=None):
+    """Runs code against (input, expected_output) tests and returns the verdict of the first failure, or AC.
+
+    Returns None if the `cancel` event is set before the tests finish.
+    """
+    # Compiled once for all tests; closing the batch on the first failure skips the rest
+    runs = governor.run_batch(code, language, [test_input for test_input, _ in tests], fair_share_key)
+    with closing(runs):
+        for (error, output, _, status), (_, expected) in zip(runs, tests):
+            if status != 'ok':
+                return STATUS_VERDICTS[status]
+            if not _same_output(output, expected):
+                return 'WA'
+            if cancel is not None and cancel.is_set():
+                return None
+    return 'AC'
+
+def judge_submission(submission_id):
+    """Runs a submission against its problem's hidden tests and records the verdict."""
+    if not _claim(submission_id):
+        return None # Already judged, or another live process is judging it
+    with _pool_lock:
+        _judging.add(submission_id)
+    try:
+        conn = database.get_db_connection()
+        submission = conn.cursor().execute("SELECT * FROM hackathon_submissions WHERE id=?", (submission_id,)).fetchone()
+        conn.close()
+        # Fair share is per team, so one team's burst can't hold every slot
+        verdict = judge_code(submission['code'], submission['language'], get_tests(submission['problem_id']),
+                             fair_share_key=f"team:{submission['team_id']}")
+        if not record_verdict(submission_id, verdict, worker_id=LOCAL_OWNER):
+            return None # Our lease lapsed and another process took the submission over
+    finally:
+        with _pool_lock:
+            _judging.discard(submission_id)
+    return verdict
+
+def _recompute_cell(cursor, hackathon, team_id, problem_id):
+    """Rebuilds one (team, problem) cell from its judged submissions, in submission order.
+
+    Verdicts can arrive out of order when judging in parallel; replaying the cell's few
+    submissions keeps the penalty exact without touching the rest of the scoreboard.
+    """
+    rejected, solved_minute = 0, None
+    for row in cursor.execute('''
+    SELECT verdict, submitted_at FROM hackathon_submissions
+    WHERE team_id=? AND problem_id=? AND status='judged' ORDER BY id
+    ''', (team_id, problem_id)).fetchall():
+        if row['verdict'] == 'AC':
+            solved_minute = int((row['submitted_at'] - hackathon['starts_at']) // 60)
+            break
+        if row['verdict'] in PENALIZED_VERDICTS:
+            rejected += 1
+    penalty = solved_minute + rejected * hackathon['penalty_minutes'] if solved_minute is not None else 0
+    return rejected, solved_minute, penalty
+
+def record_verdict(submission_id, verdict, worker_id=None):
+    """Saves a verdict and applies its effect to the scoreboard in the same transaction.
+
+    With `worker_id`, the verdict is only saved if that worker still holds the submission's
+    lease. Returns whether it was saved.
+    """
+    conn = database.get_db_connection()
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        if worker_id is None:
+            cursor.execute("UPDATE hackathon_submissions SET status='judged', verdict=?, judged_at=? WHERE id=?",
+                           (verdict, time.time(), submission_id))
+        else:
+            # Checked under the write lock, so a requeue and re-lease can't slip in between
+            cursor.execute('''
+            UPDATE hackathon_submissions SET status='judged', verdict=?, judged_at=?
+            WHERE id=? AND status='judging' AND worker_id=?
+            ''', (verdict, time.time(), submission_id, worker_id))
+            if cursor.rowcount != 1:
+                cursor.execute("ROLLBACK")
+                return False
+        submission = cursor.execute("SELECT hackathon_id, team_id, problem_id FROM hackathon_submissions WHERE id=?",
+                                    (submission_id,)).fetchone()
+        hackathon = cursor.execute("SELECT starts_at, penalty_minutes FROM hackathons WHERE id=?",
+                                   (submission['hackathon_id'],)).fetchone()
+        cell_key = (submission['hackathon_id'], submission['team_id'], submission['problem_id'])
+
+        old = cursor.execute('''
+        SELECT solved_minute, penalty FROM hackathon_scoreboard_cells WHERE hackathon_id=? AND team_id=? AND problem_id=?
+        ''', cell_key).fetchone()
+        old_solved = int(old is not None and old['solved_minute'] is not None)
+        old_penalty = old['penalty'] if old else 0
+
+        rejected, solved_minute, penalty = _recompute_cell(cursor, hackathon, submission['team_id'], submission['problem_id'])
+        cursor.execute('''
+        INSERT OR REPLACE INTO hackathon_scoreboard_cells (hackathon_id, team_id, problem_id, rejected, solved_minute, penalty)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', cell_key + (rejected, solved_minute, penalty))
+
+        # Apply only the change in this cell to the team's totals
+        new_solved = int(solved_minute is not None)
+        if new_solved != old_solved or penalty != old_penalty:
+            cursor.execute('''
+            UPDATE hackathon_scoreboard SET solved = solved + ?, penalty = penalty + ?,
+                last_solved_minute = (SELECT COALESCE(MAX(solved_minute), 0) FROM hackathon_scoreboard_cells
+                                      WHERE hackathon_id=? AND team_id=?)
+            WHERE hackathon_id=? AND team_id=?
+            ''', (new_solved - old_solved, penalty - old_penalty, cell_key[0], cell_key[1], cell_key[0], cell_key[1]))
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return True
+
+def resume_judging():
+    """Queues submissions that are unjudged and not being judged by a live process. Returns how many were queued."""
+    if JUDGE_MODE != 'local':
+        return 0 # The cluster coordinator owns the queue
+    conn = database.get_db_connection()
+    rows = conn.cursor().execute('''
+    SELECT id FROM hackathon_submissions
+    WHERE status='pending' OR (status='judging' AND (lease_expires IS NULL OR lease_expires < ?)) ORDER BY id
+    ''', (time.time(),)).fetchall()
+    conn.close()
+    for row in rows:
+        _judge_pool().submit(judge_submission, row['id'])
+    return len(rows)
+
+def get_team_submissions(team_id, limit=5):
+    """Fetches a team's most recent submissions with their verdicts."""
+    conn = database.get_db_connection()
+    rows = conn.cursor().execute('''
+    SELECT s.id, p.label, s.language, s.status, s.verdict FROM hackathon_submissions s
+    JOIN hackathon_problems p ON p.id = s.problem_id
+    WHERE s.team_id=? ORDER BY s.id DESC LIMIT ?
+    ''', (team_id, limit)).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+# --- Scoreboard ---
+def get_scoreboard(hackathon_id, limit=50):
+    """Fetches the ranked scoreboard and its per-problem cells; both are indexed reads.
+
+    Returns (rows, cells) where cells maps (team_id, problem_id) to (rejected, solved_minute).
+    """
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    rows = cursor.execute('''
+    SELECT s.team_id, t.name, s.solved, s.penalty FROM hackathon_scoreboard s
+    JOIN hackathon_teams t ON t.id = s.team_id
+    WHERE s.hackathon_id=? ORDER BY s.solved DESC, s.penalty, s.last_solved_minute LIMIT ?
+    ''', (hackathon_id, limit)).fetchall()
+    cells = {(row['team_id'], row['problem_id']): (row['rejected'], row['solved_minute'])
+             for row in cursor.execute("SELECT team_id, problem_id, rejected, solved_minute FROM hackathon_scoreboard_cells WHERE hackathon_id=?",
+                                       (hackathon_id,))}
+    conn.close()
+    return [dict(row) for row in rows], cells
+
+def print_scoreboard(hackathon_id, limit=50):
+    """Prints the live scoreboard: solved problems, penalty minutes and one column per problem."""
+    problems = get_problems(hackathon_id)
+    rows, cells = get_scoreboard(hackathon_id, limit)
+    header = f"{'Rank':<6}{'Team':<20}{'Solved':<8}{'Penalty':<9}" + ''.join(f"{p['label']:<8}" for p in problems)
+    print(f"{Colors.BOLD}{header}{Colors.ENDC}")
+    print("-" * len(header))
+    for rank, row in enumerate(rows, 1):
+        line = f"{rank:<6}{row['name'][:19]:<20}{row['solved']:<8}{row['penalty']:<9}"
+        for problem in problems:
+            rejected, solved_minute = cells.get((row['team_id'], problem['id']), (0, None))
+            if solved_minute is not None:
+                cell = f"{Colors.GREEN}{'+' + str(rejected or ''):<7}{Colors.ENDC} "
+            elif rejected:
+                cell = f"{Colors.FAIL}{'-' + str(rejected):<7}{Colors.ENDC} "
+            else:
+                cell = f"{'.':<8}"
+            line += cell
+        print(line)
+
+# --- Command Line Interface ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Set up hackathons and view their scoreboards.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    load = subparsers.add_parser('load', help="Create a hackathon and its problems from a JSON file.")
+    load.add_argument('path')
+    scoreboard = subparsers.add_parser('scoreboard', help="Print a hackathon's scoreboard.")
+    scoreboard.add_argument('name', nargs='?', default=DEFAULT_HACKATHON)
+    args = parser.parse_args(argv)
+
+    database.setup_database()
+    if args.command == 'load':
+        try:
+            hackathon_id = load_hackathon(args.path)
+        except (KeyError, ValueError, sqlite3.IntegrityError) as e:
+            print(f"{Colors.FAIL}Nothing was created: {args.path} is malformed ({type(e).__name__}: {e}).{Colors.ENDC}")
+            return
+        if hackathon_id is None:
+            print(f"{Colors.FAIL}A hackathon with that name already exists; nothing was created.{Colors.ENDC}")
+            return
+        print(f"{Colors.GREEN}Created hackathon #{hackathon_id} from {args.path}.{Colors.ENDC}")
+    elif args.command == 'scoreboard':
+        hackathon = get_hackathon_by_name(args.name)
+        if not hackathon:
+            print(f"{Colors.FAIL}No hackathon named '{args.name}'.{Colors.ENDC}")
+            return
+        print(f"\n{Colors.HEADER}=== 🏆 {hackathon['name']} Scoreboard ==={Colors.ENDC}")
+        print_scoreboard(hackathon['id'])
+
+if __name__ == "__main__":
+    main()
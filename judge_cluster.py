@@ -0,0 +1,343 @@
+# judge_cluster.py
+# Spreads hackathon judging over worker processes, on this machine or others.
+# The coordinator owns the durable queue (pending rows in hackathon_submissions)
+# and hands out jobs on short leases over a line-based JSON socket protocol.
+# Workers are stateless: they lease a job, judge it with the normal language
+# handlers, heartbeat while it runs and post the verdict back. A job whose
+# lease runs out (its worker died or hung) goes back in the queue.
+#
+#   MAVERICKS_JUDGE_TOKEN=... python judge_cluster.py coordinator --host 0.0.0.0 --port 7070
+#   python judge_cluster.py worker --coordinator 127.0.0.1:7070 --slots 4
+#   python judge_cluster.py status --coordinator 127.0.0.1:7070
+#
+# Run main.py with MAVERICKS_JUDGE_MODE=cluster so it leaves judging to the cluster.
+# If MAVERICKS_JUDGE_TOKEN is set, workers must present the same token; the coordinator
+# won't listen on a non-loopback address without one.
+
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+
+from config import Colors
+import database
+import hackathon
+
+DEFAULT_ADDRESS = ('127.0.0.1', 7070)
+LEASE_SECONDS = 30 # A job is re-dispatched if its worker is silent this long
+HEARTBEAT_SECONDS = 5
+IDLE_POLL_SECONDS = 1.0
+MAX_ATTEMPTS = 3 # A submission that loses this many workers is judged IE instead of retried forever
+KNOWN_VERDICTS = ('AC', 'WA', 'RE', 'TLE', 'CE', 'IE')
+
+def _token():
+    return os.getenv('MAVERICKS_JUDGE_TOKEN')
+
+# --- Coordinator ---
+_workers = {} # worker id -> {'last_seen': timestamp, 'job': submission id or None}
+_workers_lock = threading.Lock()
+
+def _seen(worker_id, job=False):
+    with _workers_lock:
+        state = _workers.setdefault(worker_id, {'job': None})
+        state['last_seen'] = time.time()
+        if job is not False:
+            state['job'] = job
+
+def lease_job(worker_id):
+    """Leases the oldest pending submission to a worker. Returns the job dict or None."""
+    while True:
+        conn = database.get_db_connection()
+        conn.isolation_level = None
+        cursor = conn.cursor()
+        # Idle workers poll often; only take the write lock when there is something to lease
+        if not cursor.execute("SELECT 1 FROM hackathon_submissions WHERE status='pending' LIMIT 1").fetchone():
+            conn.close()
+            return None
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            row = cursor.execute('''
+            SELECT id, team_id, problem_id, language, code, attempts FROM hackathon_submissions
+            WHERE status='pending' ORDER BY id LIMIT 1
+            ''').fetchone()
+            if row and row['attempts'] < MAX_ATTEMPTS:
+                cursor.execute('''
+                UPDATE hackathon_submissions SET status='judging', worker_id=?, lease_expires=?, attempts=attempts+1
+                WHERE id=?
+                ''', (worker_id, time.time() + LEASE_SECONDS, row['id']))
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        if not row:
+            return None
+        if row['attempts'] >= MAX_ATTEMPTS:
+            hackathon.record_verdict(row['id'], 'IE')
+            continue
+        return {'submission_id': row['id'], 'team_id': row['team_id'], 'language': row['language'],
+                'code': row['code'], 'tests': hackathon.get_tests(row['problem_id'])}
+
+def renew_lease(worker_id, submission_id):
+    """Extends a worker's lease on a job. Returns False if the job is no longer theirs."""
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+    UPDATE hackathon_submissions SET lease_expires=? WHERE id=? AND worker_id=? AND status='judging'
+    ''', (time.time() + LEASE_SECONDS, submission_id, worker_id))
+    conn.commit()
+    conn.close()
+    return cursor.rowcount == 1
+
+def complete_job(worker_id, submission_id, verdict):
+    """Records a worker's verdict if it still holds the lease. Returns whether it was accepted."""
+    return hackathon.record_verdict(submission_id, verdict, worker_id=worker_id)
+
+def requeue_expired_leases():
+    """Returns jobs whose worker stopped heartbeating to the queue. Returns how many were requeued."""
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+    UPDATE hackathon_submissions SET status='pending', worker_id=NULL, lease_expires=NULL
+    WHERE status='judging' AND (lease_expires IS NULL OR lease_expires < ?)
+    ''', (time.time(),))
+    conn.commit()
+    conn.close()
+    return cursor.rowcount
+
+def _queue_depth():
+    conn = database.get_db_connection()
+    counts = dict(conn.cursor().execute('''
+    SELECT status, COUNT(*) FROM hackathon_submissions WHERE status IN ('pending', 'judging') GROUP BY status
+    ''').fetchall())
+    conn.close()
+    return counts
+
+def _dispatch(message):
+    token = _token()
+    if token and not hmac.compare_digest(str(message.get('token') or '').encode(), token.encode()):
+        return {'ok': False, 'error': 'unauthorized'}
+    op, worker_id = message.get('op'), message.get('worker')
+    if op == 'lease':
+        job = lease_job(worker_id)
+        _seen(worker_id, job['submission_id'] if job else None)
+        return {'ok': True, 'job': job}
+    if op == 'heartbeat':
+        _seen(worker_id)
+        return {'ok': renew_lease(worker_id, message['submission_id'])}
+    if op == 'result':
+        if message.get('verdict') not in KNOWN_VERDICTS:
+            return {'ok': False, 'error': 'unknown verdict'}
+        _seen(worker_id, None)
+        return {'ok': complete_job(worker_id, message['submission_id'], message['verdict'])}
+    if op == 'status':
+        now = time.time()
+        with _workers_lock:
+            workers = {w: {'idle_seconds': round(now - s['last_seen'], 1), 'job': s['job']} for w, s in _workers.items()}
+        return {'ok': True, 'queue': _queue_depth(), 'workers': workers}
+    return {'ok': False, 'error': f"unknown op {op!r}"}
+
+class _CoordinatorHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = _dispatch(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                reply = {'ok': False, 'error': f"bad request: {e}"}
+            except sqlite3.Error as e:
+                # Usually a busy database; the worker keeps its lease and retries
+                reply = {'ok': False, 'error': f"coordinator database error: {e}"}
+            self.wfile.write((json.dumps(reply) + '\n').encode())
+            self.wfile.flush()
+
+class _CoordinatorServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def _reaper(stop):
+    while not stop.wait(LEASE_SECONDS / 3):
+        requeued = requeue_expired_leases()
+        if requeued:
+            print(f"{Colors.WARNING}Re-dispatching {requeued} job(s) from unresponsive workers.{Colors.ENDC}")
+
+def _is_loopback(host):
+    """True if every address `host` resolves to is a loopback address."""
+    try:
+        infos = socket.getaddrinfo(host or None, None, proto=socket.IPPROTO_TCP, flags=socket.AI_PASSIVE)
+    except socket.gaierror:
+        return False
+    return all(ipaddress.ip_address(info[4][0].split('%')[0]).is_loopback for info in infos)
+
+def run_coordinator(address=DEFAULT_ADDRESS):
+    """Serves the judge queue until interrupted. Returns False if it refused to start."""
+    # Leasing a job hands out hidden tests and teams' code, so off this machine the token is required
+    if not _token() and not _is_loopback(address[0]):
+        print(f"{Colors.FAIL}Refusing to listen on {address[0]} without MAVERICKS_JUDGE_TOKEN. "
+              f"Set it on the coordinator and every worker, or bind to 127.0.0.1.{Colors.ENDC}")
+        return False
+    database.setup_database()
+    requeue_expired_leases() # Anything 'judging' from before a restart has no live worker
+    stop = threading.Event()
+    threading.Thread(target=_reaper, args=(stop,), daemon=True).start()
+    with _CoordinatorServer(address, _CoordinatorHandler) as server:
+        print(f"{Colors.GREEN}Judge coordinator listening on {address[0]}:{address[1]}{Colors.ENDC}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop.set()
+
+# --- Worker ---
+class _Client:
+    """One connection to the coordinator; calls are serialized so a heartbeat can share it."""
+
+    def __init__(self, address):
+        self._sock = socket.create_connection(address, timeout=30)
+        self._file = self._sock.makefile('rwb')
+        self._lock = threading.Lock()
+
+    def call(self, message):
+        message = dict(message, token=_token())
+        with self._lock:
+            self._file.write((json.dumps(message) + '\n').encode())
+            self._file.flush()
+            line = self._file.readline()
+        if not line:
+            raise ConnectionError("coordinator closed the connection")
+        return json.loads(line)
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+def _heartbeat(client, worker_id, submission_id, done, lost):
+    while not done.wait(HEARTBEAT_SECONDS):
+        try:
+            reply = client.call({'op': 'heartbeat', 'worker': worker_id, 'submission_id': submission_id})
+        except (OSError, ValueError):
+            return # The main loop will notice and reconnect
+        if not reply.get('ok') and not reply.get('error'):
+            lost.set() # The lease was requeued and may already be someone else's job
+            return
+
+def _worker_slot(address, worker_id, stop):
+    backoff = 1
+    unsent = None # A result the coordinator hasn't acknowledged; it survives a reconnect
+    while not stop.is_set():
+        try:
+            client = _Client(address)
+        except OSError as e:
+            print(f"{Colors.WARNING}[{worker_id}] Can't reach coordinator ({e}); retrying in {backoff}s{Colors.ENDC}")
+            stop.wait(backoff)
+            backoff = min(backoff * 2, 30)
+            continue
+        backoff = 1
+        try:
+            while not stop.is_set():
+                if unsent:
+                    reply = client.call(unsent)
+                    if reply.get('error'):
+                        print(f"{Colors.WARNING}[{worker_id}] Result for #{unsent['submission_id']} not recorded "
+                              f"({reply['error']}); retrying in {backoff}s{Colors.ENDC}")
+                        stop.wait(backoff)
+                        backoff = min(backoff * 2, 30)
+                        continue
+                    if reply.get('ok'):
+                        print(f"[{worker_id}] Submission #{unsent['submission_id']}: {unsent['verdict']}")
+                    else:
+                        print(f"{Colors.WARNING}[{worker_id}] Lease on #{unsent['submission_id']} expired; "
+                              f"its result was dropped{Colors.ENDC}")
+                    unsent, backoff = None, 1
+                    continue
+
+                reply = client.call({'op': 'lease', 'worker': worker_id})
+                if not reply.get('ok'):
+                    print(f"{Colors.FAIL}[{worker_id}] Coordinator refused: {reply.get('error')}{Colors.ENDC}")
+                    stop.wait(backoff * 5)
+                    continue
+                job = reply.get('job')
+                if not job:
+                    stop.wait(IDLE_POLL_SECONDS)
+                    continue
+
+                done, lost = threading.Event(), threading.Event()
+                threading.Thread(target=_heartbeat, args=(client, worker_id, job['submission_id'], done, lost),
+                                 daemon=True).start()
+                try:
+                    verdict = hackathon.judge_code(job['code'], job['language'], job['tests'],
+                                                   fair_share_key=f"team:{job['team_id']}", cancel=lost)
+                finally:
+                    done.set()
+                if lost.is_set():
+                    print(f"{Colors.WARNING}[{worker_id}] Lost the lease on #{job['submission_id']}; "
+                          f"stopped judging it{Colors.ENDC}")
+                    continue
+                unsent = {'op': 'result', 'worker': worker_id, 'submission_id': job['submission_id'], 'verdict': verdict}
+        except (OSError, ValueError) as e:
+            print(f"{Colors.WARNING}[{worker_id}] Lost coordinator ({e}); reconnecting{Colors.ENDC}")
+        finally:
+            client.close()
+
+def run_worker(address=DEFAULT_ADDRESS, slots=None, worker_id=None):
+    """Judges jobs from the coordinator on `slots` threads until interrupted."""
+    slots = slots or os.cpu_count() or 1
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    stop = threading.Event()
+    threads = [threading.Thread(target=_worker_slot, args=(address, f"{worker_id}/{i}", stop), daemon=True)
+               for i in range(slots)]
+    for thread in threads:
+        thread.start()
+    print(f"{Colors.GREEN}Judge worker {worker_id} running {slots} slot(s) against {address[0]}:{address[1]}{Colors.ENDC}")
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop.set()
+
+# --- Command Line Interface ---
+def _parse_address(text):
+    host, _, port = text.rpartition(':')
+    return (host or DEFAULT_ADDRESS[0], int(port))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run distributed hackathon judging.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    coordinator = subparsers.add_parser('coordinator', help="Serve the judge queue.")
+    coordinator.add_argument('--host', default=DEFAULT_ADDRESS[0])
+    coordinator.add_argument('--port', type=int, default=DEFAULT_ADDRESS[1])
+    worker = subparsers.add_parser('worker', help="Judge jobs from a coordinator.")
+    worker.add_argument('--coordinator', type=_parse_address, default=DEFAULT_ADDRESS, help="host:port")
+    worker.add_argument('--slots', type=int, default=None, help="Jobs judged at once (default: CPU count).")
+    worker.add_argument('--id', default=None, help="Worker name shown in status output.")
+    status = subparsers.add_parser('status', help="Show queue depth and connected workers.")
+    status.add_argument('--coordinator', type=_parse_address, default=DEFAULT_ADDRESS, help="host:port")
+    args = parser.parse_args(argv)
+
+    if args.command == 'coordinator':
+        run_coordinator((args.host, args.port))
+    elif args.command == 'worker':
+        run_worker(args.coordinator, args.slots, args.id)
+    elif args.command == 'status':
+        client = _Client(args.coordinator)
+        reply = client.call({'op': 'status'})
+        client.close()
+        if not reply.get('ok'):
+            print(f"{Colors.FAIL}{reply.get('error')}{Colors.ENDC}")
+            return
+        queue = reply['queue']
+        print(f"{Colors.BOLD}Queue:{Colors.ENDC} {queue.get('pending', 0)} pending, {queue.get('judging', 0)} judging")
+        print(f"{Colors.BOLD}{'Worker':<30}{'Idle (s)':<10}{'Job'}{Colors.ENDC}")
+        for name, state in sorted(reply['workers'].items()):
+            print(f"{name:<30}{state['idle_seconds']:<10}{state['job'] or '-'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+# loadtest.py
+# End-to-end capacity test: drives many scripted main.py sessions at once
+# against a scratch database and a local Gemini stand-in, then reports
+# throughput, per-action latency percentiles, error rates and database
+# write-lock contention. Give several arrival rates to find the saturation point:
+#
+#   python loadtest.py --rates 0.5,1,2,4 --duration 30 --ai-latency 0.8
+#   python loadtest.py --mix code=1 --languages python --json results.json
+
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import Colors
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MIX = "code=4,assessment=1,dashboard=2,leaderboard=2"
+LOCK_PROBE_INTERVAL = 0.2
+
+# Programs that print a known answer; the number varies so the verdict cache doesn't hide the work
+CODE_SAMPLES = {
+    'python': "print({n} + 42)",
+    'java': "public class Main {{\npublic static void main(String[] args) {{\nSystem.out.println({n} + 42);\n}}\n}}",
+    'c++': "#include <iostream>\nint main() {{\nstd::cout << {n} + 42;\n}}",
+}
+CHECK_COMMENTS = {'python': "# check", 'java': "// check", 'c++': "// check"}
+TOOLCHAINS = {'python': None, 'java': 'javac', 'c++': 'g++'}
+
+# --- Gemini Stand-In ---
+class _StubState:
+    latency = 0.5
+    jitter = 0.2
+    error_rate = 0.0
+    requests = 0
+    lock = threading.Lock()
+
+def _stub_reply(prompt, wants_json):
+    if not wants_json:
+        return "Keep going, you're doing great!"
+    if 'multiple-choice quiz' in prompt:
+        return json.dumps([{'question': f"Question {i}?", 'options': {'a': "Yes", 'b': "No", 'c': "Maybe"}, 'answer': 'a'}
+                           for i in range(3)])
+    if 'coding challenge' in prompt:
+        lang = next((l for l in CHECK_COMMENTS if f" {l} " in prompt), 'python')
+        return json.dumps({'problem': "Print 42.", 'check_code': CHECK_COMMENTS[lang], 'expected_output': "42"})
+    return json.dumps({'Software Engineer': "90%", 'Data Analyst': "75%", 'QA Engineer': "60%"})
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with _StubState.lock:
+            _StubState.requests += 1
+        time.sleep(max(0.0, random.gauss(_StubState.latency, _StubState.jitter)))
+        if random.random() < _StubState.error_rate:
+            self.send_response(503)
+            self.end_headers()
+            return
+        prompt = body['contents'][0]['parts'][0]['text']
+        wants_json = body.get('generationConfig', {}).get('responseMimeType') == 'application/json'
+        reply = json.dumps({'candidates': [{'content': {'parts': [{'text': _stub_reply(prompt, wants_json)}]}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass # Keep the report readable
+
+def start_gemini_stub(latency, jitter, error_rate):
+    """Starts the stand-in on a free local port. Returns (server, base_url)."""
+    _StubState.latency, _StubState.jitter, _StubState.error_rate = latency, jitter, error_rate
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# --- Scripted Session ---
+class _Session:
+    """A main.py process driven through its prompts, like a person at a terminal."""
+
+    def __init__(self, workdir, env, action_timeout):
+        self.action_timeout = action_timeout
+        self.proc = subprocess.Popen([sys.executable, '-u', os.path.join(APP_DIR, 'main.py')], cwd=workdir, env=env,
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                     start_new_session=True) # No terminal, so getpass reads the pipe
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._cond = threading.Condition()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        while True:
+            chunk = os.read(self.proc.stdout.fileno(), 4096)
+            with self._cond:
+                if not chunk:
+                    self._eof = True
+                else:
+                    self._buffer += chunk.decode('utf-8', 'replace')
+                self._cond.notify_all()
+            if not chunk:
+                return
+
+    def send(self, *lines):
+        self.proc.stdin.write(''.join(line + '\n' for line in lines).encode())
+        self.proc.stdin.flush()
+
+    def expect(self, *patterns):
+        """Waits for the first of `patterns` to appear. Returns (index, text consumed)."""
+        regexes = [re.compile(p) for p in patterns]
+        deadline = time.time() + self.action_timeout
+        with self._cond:
+            while True:
+                hits = [(m.end(), i) for i, r in enumerate(regexes) for m in [r.search(self._buffer, self._pos)] if m]
+                if hits:
+                    end, index = min(hits)
+                    text, self._pos = self._buffer[self._pos:end], end
+                    return index, text
+                if self._eof:
+                    raise EOFError("session exited")
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"no {patterns} within {self.action_timeout}s")
+                self._cond.wait(remaining)
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+CHOICE = r"Choice: "
+
+def _action_register(session, name, _):
+    session.send('2', name, 'loadtest', 'python')
+    _, text = session.expect(CHOICE)
+    return 'registered successfully' in text
+
+def _action_login(session, name, _):
+    session.send('1', name, 'loadtest')
+    _, text = session.expect(CHOICE)
+    return 'Welcome back' in text
+
+def _action_code(session, name, language):
+    code = CODE_SAMPLES[language].format(n=random.randint(0, 10 ** 6))
+    session.send('1', language, *code.split('\n'), '')
+    session.expect(r"Enter your code")
+    index, text = session.expect(r"help you debug\? \(y/n\): ", r"or 'back': ")
+    ok = index == 1 and 'Success!' in text
+    if index == 0:
+        session.send('n')
+        session.expect(r"or 'back': ")
+    session.send('back')
+    session.expect(CHOICE)
+    return ok
+
+def _action_assessment(session, name, language):
+    session.send('2', language)
+    for _ in range(3):
+        session.expect(r"Your answer: ")
+        session.send('a')
+    session.expect(r"end with blank line\):")
+    session.send(*CODE_SAMPLES[language].format(n=0).split('\n'), '')
+    _, text = session.expect(CHOICE)
+    return 'Coding challenge passed!' in text
+
+def _action_dashboard(session, name, _):
+    session.send('6')
+    _, text = session.expect(CHOICE)
+    return 'Personal Dashboard' in text
+
+def _action_leaderboard(session, name, language):
+    session.send('7', random.choice(['', 'daily', 'weekly']), random.choice(['', language]))
+    _, text = session.expect(CHOICE)
+    return 'Leaderboard ===' in text
+
+ACTIONS = {
+    'register': _action_register,
+    'login': _action_login,
+    'code': _action_code,
+    'assessment': _action_assessment,
+    'dashboard': _action_dashboard,
+    'leaderboard': _action_leaderboard,
+}
+
+# --- Load Driver ---
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {} # action -> [seconds] for successful actions
+        self.errors = {} # action -> count
+        self.locked_errors = 0
+        self.sessions_completed = 0
+
+    def record(self, action, seconds, ok):
+        with self.lock:
+            if ok:
+                self.latencies.setdefault(action, []).append(seconds)
+            else:
+                self.errors[action] = self.errors.get(action, 0) + 1
+                self.latencies.setdefault(action, [])
+
+def _run_session(name, config, stats):
+    session = _Session(config['workdir'], config['env'], config['action_timeout'])
+    script = ['register', 'login'] + random.choices(config['mix_names'], config['mix_weights'], k=config['actions'])
+    try:
+        session.expect(CHOICE)
+        for i, action in enumerate(script):
+            if i >= 2:
+                time.sleep(random.expovariate(1 / config['think_time']) if config['think_time'] > 0 else 0)
+            language = random.choice(config['languages'])
+            start = time.perf_counter()
+            try:
+                ok = ACTIONS[action](session, name, language)
+            except (TimeoutError, EOFError, OSError):
+                stats.record(action, time.perf_counter() - start, False)
+                return # The session is no longer in a known state
+            stats.record(action, time.perf_counter() - start, ok)
+        session.send('8', '3') # Logout, exit
+        with stats.lock:
+            stats.sessions_completed += 1
+    finally:
+        session.close()
+        with stats.lock:
+            stats.locked_errors += session._buffer.count('database is locked')
+
+def _probe_write_lock(db_path, stop, waits):
+    """Measures how long a writer has to wait for the database, as a contention signal."""
+    while not stop.wait(LOCK_PROBE_INTERVAL):
+        if not os.path.exists(db_path):
+            continue
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        start = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            waits.append(time.perf_counter() - start)
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            waits.append(30.0)
+        finally:
+            conn.close()
+
+def run_stage(rate, duration, config, stage_id):
+    """Starts sessions as a Poisson process at `rate` per second for `duration` seconds and waits for them."""
+    stats = _Stats()
+    waits = []
+    stop = threading.Event()
+    prober = threading.Thread(target=_probe_write_lock, args=(os.path.join(config['workdir'], 'mavericks.db'), stop, waits),
+                              daemon=True)
+    prober.start()
+    requests_before = _StubState.requests
+
+    threads = []
+    start = time.perf_counter()
+    next_arrival = start
+    while next_arrival < start + duration:
+        time.sleep(max(0.0, next_arrival - time.perf_counter()))
+        name = f"load{stage_id}_{len(threads)}_{random.randint(0, 10 ** 6)}"
+        thread = threading.Thread(target=_run_session, args=(name, config, stats), daemon=True)
+        thread.start()
+        threads.append(thread)
+        next_arrival += random.expovariate(rate)
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    stop.set()
+    prober.join()
+
+    return {'rate': rate, 'sessions': len(threads), 'sessions_completed': stats.sessions_completed, 'wall_seconds': wall,
+            'latencies': stats.latencies, 'errors': stats.errors, 'lock_waits': waits,
+            'locked_errors': stats.locked_errors, 'ai_requests': _StubState.requests - requests_before}
+
+# --- Reporting ---
+def percentile(values, pct):
+    """Nearest-rank percentile of a list; None if it's empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+def summarize(stage):
+    """Turns a stage's raw samples into the numbers the report shows."""
+    actions = {}
+    total_done = 0
+    for action in ACTIONS:
+        if action not in stage['latencies']:
+            continue
+        samples, errors = stage['latencies'][action], stage['errors'].get(action, 0)
+        total_done += len(samples) + errors
+        actions[action] = {'count': len(samples) + errors, 'errors': errors,
+                           'error_rate': errors / (len(samples) + errors),
+                           **{f"p{p}": percentile(samples, p) for p in (50, 90, 99)}, 'max': max(samples, default=None)}
+    waits = stage['lock_waits']
+    return {'rate': stage['rate'], 'sessions': stage['sessions'], 'sessions_completed': stage['sessions_completed'],
+            'wall_seconds': stage['wall_seconds'], 'actions_per_second': total_done / stage['wall_seconds'],
+            'actions': actions, 'ai_requests': stage['ai_requests'], 'locked_errors': stage['locked_errors'],
+            'lock_wait': {'p50': percentile(waits, 50), 'p95': percentile(waits, 95), 'max': max(waits, default=None)}}
+
+def _ms(seconds):
+    return '-' if seconds is None else f"{seconds * 1000:.0f}"
+
+def print_report(summary):
+    print(f"\n{Colors.HEADER}=== Arrival rate {summary['rate']}/s: {summary['sessions']} sessions "
+          f"({summary['sessions_completed']} completed) in {summary['wall_seconds']:.1f}s ==={Colors.ENDC}")
+    print(f"Throughput: {Colors.BOLD}{summary['actions_per_second']:.2f} actions/s{Colors.ENDC}, "
+          f"AI stand-in requests: {summary['ai_requests']}")
+    header = f"{'Action':<13}{'Count':<8}{'Errors':<8}{'Err %':<8}{'p50 ms':<9}{'p90 ms':<9}{'p99 ms':<9}{'max ms'}"
+    print(f"{Colors.BOLD}{header}{Colors.ENDC}")
+    print("-" * len(header))
+    for action, a in summary['actions'].items():
+        color = Colors.FAIL if a['errors'] else ''
+        print(f"{color}{action:<13}{a['count']:<8}{a['errors']:<8}{a['error_rate'] * 100:<8.1f}"
+              f"{_ms(a['p50']):<9}{_ms(a['p90']):<9}{_ms(a['p99']):<9}{_ms(a['max'])}{Colors.ENDC if color else ''}")
+    wait = summary['lock_wait']
+    print(f"DB write-lock wait: p50 {_ms(wait['p50'])} ms, p95 {_ms(wait['p95'])} ms, max {_ms(wait['max'])} ms; "
+          f"'database is locked' errors: {summary['locked_errors']}")
+
+# --- Command Line Interface ---
+def _parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ACTIONS or name.strip() in ('register', 'login'):
+            raise argparse.ArgumentTypeError(f"unknown action '{name}'")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive concurrent scripted sessions to measure capacity.")
+    parser.add_argument('--rates', default="1", help="Comma-separated session arrival rates (per second), one stage each.")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds of arrivals per stage.")
+    parser.add_argument('--actions', type=int, default=5, help="Actions per session after register and login.")
+    parser.add_argument('--think-time', type=float, default=1.0, help="Mean pause between actions, in seconds.")
+    parser.add_argument('--mix', type=_parse_mix, default=_parse_mix(DEFAULT_MIX), help=f"Action weights (default {DEFAULT_MIX}).")
+    parser.add_argument('--languages', default="python,java,c++", help="Languages for code and assessment actions.")
+    parser.add_argument('--ai-latency', type=float, default=0.5, help="Mean stand-in AI response time, in seconds.")
+    parser.add_argument('--ai-jitter', type=float, default=0.2, help="Standard deviation of the AI response time.")
+    parser.add_argument('--ai-error-rate', type=float, default=0.0, help="Fraction of AI requests answered with HTTP 503.")
+    parser.add_argument('--action-timeout', type=float, default=60, help="Seconds before an action counts as failed.")
+    parser.add_argument('--workdir', default=None, help="Directory for the scratch database (default: a new temp dir).")
+    parser.add_argument('--json', default=None, help="Also write the summaries to this file.")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    languages = []
+    for lang in args.languages.split(','):
+        if TOOLCHAINS.get(lang, '') is None or (TOOLCHAINS.get(lang) and shutil.which(TOOLCHAINS[lang])):
+            languages.append(lang)
+        else:
+            print(f"{Colors.WARNING}Skipping {lang}: its toolchain isn't installed.{Colors.ENDC}")
+    if not languages:
+        parser.error("no usable languages")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='mavericks-load-')
+    server, base_url = start_gemini_stub(args.ai_latency, args.ai_jitter, args.ai_error_rate)
+    env = dict(os.environ, GEMINI_API_KEY='loadtest', GEMINI_API_BASE=base_url, PYTHONUNBUFFERED='1')
+    config = {'workdir': workdir, 'env': env, 'action_timeout': args.action_timeout, 'actions': args.actions,
+              'think_time': args.think_time, 'languages': languages,
+              'mix_names': list(args.mix), 'mix_weights': list(args.mix.values())}
+    print(f"{Colors.CYAN}Scratch database in {workdir}; AI stand-in at {base_url}{Colors.ENDC}")
+
+    summaries = []
+    try:
+        for stage_id, rate in enumerate(float(r) for r in args.rates.split(',')):
+            summary = summarize(run_stage(rate, args.duration, config, stage_id))
+            print_report(summary)
+            summaries.append(summary)
+    finally:
+        server.shutdown()
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summaries, f, indent=2)
+        print(f"\n{Colors.GREEN}Wrote results to {args.json}{Colors.ENDC}")
+
+if __name__ == "__main__":
+    main()
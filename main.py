@@ -2,6 +2,7 @@
 # This is the main entry point for the Mavericks Platform application.
 # It connects all the other modules (agents, database, config) and runs the app.
 
+import argparse
 import getpass
 from dotenv import load_dotenv
 
@@ -12,6 +13,9 @@ load_dotenv()
 from config import Colors
 import database
 import agents
+import hackathon
+import task_queue
+import profiling
 
 # --- Global State ---
 # This dictionary will hold the data for the currently logged-in user
@@ -108,7 +112,7 @@ def show_user_menu():
     print(f"{Colors.BOLD}4. 🧠 Explain a Concept with AI{Colors.ENDC}")
     print(f"{Colors.BOLD}5. 📄 Update Profile from Resume{Colors.ENDC}")
     print(f"{Colors.BOLD}6. 📊 View Your Dashboard{Colors.ENDC}")
-    print(f"{Colors.BOLD}7. 🥇 View Global Leaderboard{Colors.ENDC}")
+    print(f"{Colors.BOLD}7. 🥇 View Leaderboards{Colors.ENDC}")
     print(f"{Colors.BOLD}8. 🚪 Logout{Colors.ENDC}")
 
 # --- Main Application Loop ---
@@ -116,25 +120,29 @@ def main_loop():
     """The main function that runs the application loop."""
     global current_user
     database.setup_database() # Ensure tables exist before we start
+    database.expire_leaderboard_windows() # Drop stale daily/weekly leaderboard rows
+    task_queue.start_workers() # AI feedback runs in the background, off the interactive path
+    hackathon.resume_judging() # Pick up hackathon submissions left unjudged last time
     
     while True:
         if current_user:
+            task_queue.deliver_results(current_user['name']) # AI results that finished since the last menu
             show_user_menu()
             choice = input("Choice: ")
             if choice == '1':
-                interactive_code_compiler()
+                profiling.run(interactive_code_compiler)
             elif choice == '2':
-                agents.take_ai_assessment(current_user)
+                profiling.run(agents.take_ai_assessment, current_user)
             elif choice == '3':
-                agents.hackathon_portal()
+                profiling.run(agents.hackathon_portal, current_user)
             elif choice == '4':
-                agents.explain_concept_cli()
+                profiling.run(agents.explain_concept_cli)
             elif choice == '5':
-                agents.update_profile_from_resume(current_user)
+                profiling.run(agents.update_profile_from_resume, current_user)
             elif choice == '6':
-                agents.show_dashboard(current_user)
+                profiling.run(agents.show_dashboard, current_user)
             elif choice == '7':
-                agents.show_leaderboard()
+                profiling.run(agents.show_leaderboard, current_user)
             elif choice == '8':
                 logout()
         else:
@@ -146,8 +154,15 @@ def main_loop():
                 register()
             elif choice == '3':
                 print("Thank you for using the Mavericks Platform!")
+                task_queue.stop_workers()
                 break
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mavericks Coding Platform")
+    parser.add_argument('--profile', nargs='?', const='', metavar='DIR',
+                        help="profile each menu action (cProfile, tracemalloc, collapsed stacks) into DIR (default: profiles)")
+    args = parser.parse_args()
+    if args.profile is not None:
+        profiling.enable(args.profile or None)
     # This ensures the main_loop function runs when the script is executed
     main_loop()
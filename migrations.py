@@ -0,0 +1,342 @@
+# migrations.py
+# Versioned schema migrations for mavericks.db.
+# The schema version lives in PRAGMA user_version, so an up-to-date database
+# costs a single pragma read on startup. Run this file directly to inspect or
+# upgrade a database by hand:
+#
+#   python migrations.py status
+#   python migrations.py upgrade [--target N] [--chunk-size N]
+
+import argparse
+import sqlite3
+
+from config import Colors
+
+DEFAULT_CHUNK_SIZE = 500 # Rows per transaction for data migrations on large tables
+
+# --- Migration Steps ---
+# Plain steps run inside one transaction together with the version bump.
+# Chunked steps take (conn, chunk_size) and commit batch by batch, so big
+# databases never hold the write lock for long; they must be safe to resume.
+
+def _create_users(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE,
+        password TEXT,
+        skill TEXT,
+        gems INTEGER DEFAULT 0,
+        badge TEXT DEFAULT 'Newbie',
+        streak INTEGER DEFAULT 0,
+        last_login TEXT DEFAULT CURRENT_DATE,
+        last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        assessment_scores TEXT,
+        resume_text TEXT
+    )
+    ''')
+    # Older databases predate these columns; add only the ones that are missing
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+    for column, ddl in (('assessment_scores', 'TEXT'), ('resume_text', 'TEXT'), ('gems', 'INTEGER DEFAULT 0')):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE users ADD COLUMN {column} {ddl}")
+
+def _create_leaderboard_rollups(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS leaderboard_rollups (
+        period TEXT NOT NULL,
+        period_start TEXT NOT NULL,
+        skill TEXT NOT NULL,
+        user_name TEXT NOT NULL,
+        gems INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (period, period_start, skill, user_name)
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS migration_progress (
+        version INTEGER PRIMARY KEY,
+        last_id INTEGER NOT NULL
+    )
+    ''')
+
+def _backfill_leaderboard_rollups(conn, chunk_size):
+    """Seeds the all-time per-skill leaderboards from existing gem totals, in batches of users."""
+    progress = conn.execute("SELECT last_id FROM migration_progress WHERE version=3").fetchone()
+    if progress is None:
+        if conn.execute("SELECT 1 FROM leaderboard_rollups LIMIT 1").fetchone():
+            return # Rollups were already being maintained before this migration existed
+        last_id = 0
+    else:
+        last_id = progress[0]
+
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM users WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk_size))]
+            if ids:
+                conn.execute('''
+                INSERT OR IGNORE INTO leaderboard_rollups (period, period_start, skill, user_name, gems)
+                SELECT 'all', '', LOWER(skill), name, gems FROM users
+                WHERE id BETWEEN ? AND ? AND gems > 0 AND skill IS NOT NULL
+                ''', (ids[0], ids[-1]))
+                last_id = ids[-1]
+                conn.execute("INSERT OR REPLACE INTO migration_progress (version, last_id) VALUES (3, ?)", (last_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if len(ids) < chunk_size:
+            break
+
+def _create_hot_query_indexes(conn):
+    # Leaderboard reads: one partition, already sorted by gems
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rollups_rank ON leaderboard_rollups (period, period_start, skill, gems DESC)")
+    # Leaderboard expiry and user deletion
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rollups_user ON leaderboard_rollups (user_name)")
+    # All-time global leaderboard
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_gems ON users (gems DESC)")
+    # name lookups are already served by the UNIQUE constraint's automatic index
+    conn.execute("DELETE FROM migration_progress WHERE version=3")
+
+def _create_ai_jobs(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS ai_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        user_name TEXT,
+        dedupe_key TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        priority INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        leased_until REAL,
+        result TEXT,
+        created_at REAL NOT NULL,
+        delivered INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    # At most one live job per dedupe key; finished ones don't block a new request
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_ai_jobs_live ON ai_jobs (dedupe_key) WHERE status IN ('pending', 'running')")
+    # Workers claim the highest-priority job that is due
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_jobs_claim ON ai_jobs (status, priority DESC, next_attempt_at)")
+    # Results waiting to be shown to a user
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_jobs_inbox ON ai_jobs (user_name, delivered, status)")
+
+def _create_verdict_cache(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS verdict_cache (
+        cache_key TEXT PRIMARY KEY,
+        language TEXT NOT NULL,
+        toolchain TEXT NOT NULL,
+        error TEXT,
+        output TEXT,
+        usage TEXT,
+        created_at REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    # Dropping entries built by an old compiler or interpreter
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_verdict_cache_toolchain ON verdict_cache (language, toolchain)")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS submission_fingerprints (
+        fingerprint TEXT NOT NULL,
+        user_name TEXT NOT NULL,
+        language TEXT NOT NULL,
+        first_seen REAL NOT NULL,
+        submissions INTEGER NOT NULL DEFAULT 1,
+        PRIMARY KEY (fingerprint, user_name)
+    )
+    ''')
+
+def _create_hackathon_tables(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS hackathons (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        starts_at REAL NOT NULL,
+        ends_at REAL NOT NULL,
+        penalty_minutes INTEGER NOT NULL DEFAULT 20
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS hackathon_problems (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        hackathon_id INTEGER NOT NULL,
+        label TEXT NOT NULL,
+        title TEXT NOT NULL,
+        statement TEXT,
+        UNIQUE (hackathon_id, label)
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS hackathon_tests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        problem_id INTEGER NOT NULL,
+        input TEXT NOT NULL DEFAULT '',
+        expected_output TEXT NOT NULL
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_hackathon_tests_problem ON hackathon_tests (problem_id)")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS hackathon_teams (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        hackathon_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        UNIQUE (hackathon_id, name)
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS hackathon_members (
+        hackathon_id INTEGER NOT NULL,
+        user_name TEXT NOT NULL,
+        team_id INTEGER NOT NULL,
+        PRIMARY KEY (hackathon_id, user_name)
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS hackathon_submissions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        hackathon_id INTEGER NOT NULL,
+        team_id INTEGER NOT NULL,
+        problem_id INTEGER NOT NULL,
+        user_name TEXT,
+        language TEXT NOT NULL,
+        code TEXT NOT NULL,
+        submitted_at REAL NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        verdict TEXT,
+        judged_at REAL
+    )
+    ''')
+    # Recomputing one scoreboard cell, and finding work left over after a restart
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_submissions_cell ON hackathon_submissions (team_id, problem_id, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_submissions_status ON hackathon_submissions (status)")
+    # Scoreboard: one row per team plus one cell per (team, problem), updated on every verdict
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS hackathon_scoreboard (
+        hackathon_id INTEGER NOT NULL,
+        team_id INTEGER NOT NULL,
+        solved INTEGER NOT NULL DEFAULT 0,
+        penalty INTEGER NOT NULL DEFAULT 0,
+        last_solved_minute INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (hackathon_id, team_id)
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scoreboard_rank ON hackathon_scoreboard (hackathon_id, solved DESC, penalty, last_solved_minute)")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS hackathon_scoreboard_cells (
+        hackathon_id INTEGER NOT NULL,
+        team_id INTEGER NOT NULL,
+        problem_id INTEGER NOT NULL,
+        rejected INTEGER NOT NULL DEFAULT 0,
+        solved_minute INTEGER,
+        penalty INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (hackathon_id, team_id, problem_id)
+    )
+    ''')
+
+def _add_judge_leases(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(hackathon_submissions)")}
+    for column, ddl in (('worker_id', 'TEXT'), ('lease_expires', 'REAL'), ('attempts', 'INTEGER NOT NULL DEFAULT 0')):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE hackathon_submissions ADD COLUMN {column} {ddl}")
+
+# (version, description, step, chunked) -- append only, never renumber
+MIGRATIONS = [
+    (1, "Create users table and profile columns", _create_users, False),
+    (2, "Create leaderboard rollup tables", _create_leaderboard_rollups, False),
+    (3, "Backfill all-time per-skill leaderboards", _backfill_leaderboard_rollups, True),
+    (4, "Add indexes for leaderboard and lookup queries", _create_hot_query_indexes, False),
+    (5, "Create background AI job queue", _create_ai_jobs, False),
+    (6, "Create verdict cache and submission fingerprints", _create_verdict_cache, False),
+    (7, "Create hackathon judging and scoreboard tables", _create_hackathon_tables, False),
+    (8, "Add worker leases to hackathon submissions", _add_judge_leases, False),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# --- Runner ---
+def _connect(db_file):
+    # Autocommit mode: every transaction below is opened and closed explicitly
+    return sqlite3.connect(db_file, isolation_level=None, timeout=30)
+
+def get_schema_version(conn):
+    """Returns the schema version recorded in the database file."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(db_file, target=None, chunk_size=DEFAULT_CHUNK_SIZE, verbose=False):
+    """Applies every pending migration up to `target` (default: latest). Returns the versions applied."""
+    target = LATEST_VERSION if target is None else target
+    conn = _connect(db_file)
+    applied = []
+    try:
+        current = get_schema_version(conn)
+        if current >= target:
+            return applied # Fast path: schema is already current
+
+        for version, description, step, chunked in MIGRATIONS:
+            if version <= current or version > target:
+                continue
+            # Another process sharing the file may have applied it since we last looked
+            if get_schema_version(conn) >= version:
+                continue
+            if verbose:
+                print(f"{Colors.CYAN}Applying migration {version}: {description}...{Colors.ENDC}")
+            if chunked:
+                step(conn, chunk_size)
+            conn.execute("BEGIN IMMEDIATE")
+            # Re-check under the write lock so a slower process never moves the version backwards
+            if get_schema_version(conn) >= version:
+                conn.execute("ROLLBACK")
+                continue
+            if not chunked:
+                try:
+                    step(conn)
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            # PRAGMA cannot take parameters; version is always an int from MIGRATIONS
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.execute("COMMIT")
+            applied.append(version)
+    finally:
+        conn.close()
+    return applied
+
+def pending_migrations(db_file):
+    """Returns (current version, list of pending migrations) for a database file."""
+    conn = _connect(db_file)
+    try:
+        current = get_schema_version(conn)
+    finally:
+        conn.close()
+    return current, [m for m in MIGRATIONS if m[0] > current]
+
+# --- Command Line Interface ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and upgrade the Mavericks database schema.")
+    parser.add_argument('--db', default="mavericks.db", help="Path to the SQLite database file.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="Show the current schema version and pending migrations.")
+    upgrade = subparsers.add_parser('upgrade', help="Apply pending migrations.")
+    upgrade.add_argument('--target', type=int, default=None, help="Stop after this version (default: latest).")
+    upgrade.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per transaction for data migrations.")
+    args = parser.parse_args(argv)
+
+    if args.command == 'status':
+        current, pending = pending_migrations(args.db)
+        print(f"{Colors.BOLD}Schema version:{Colors.ENDC} {current} (latest {LATEST_VERSION})")
+        if not pending:
+            print(f"{Colors.GREEN}Schema is up to date.{Colors.ENDC}")
+        for version, description, _, _ in pending:
+            print(f"  {Colors.WARNING}pending{Colors.ENDC} {version}: {description}")
+    elif args.command == 'upgrade':
+        applied = migrate(args.db, target=args.target, chunk_size=args.chunk_size, verbose=True)
+        if applied:
+            print(f"{Colors.GREEN}Applied migrations: {', '.join(map(str, applied))}{Colors.ENDC}")
+        else:
+            print(f"{Colors.GREEN}Nothing to do; schema is up to date.{Colors.ENDC}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# profiling.py
+# On-demand profiling of menu actions. Turn it on with `python main.py --profile`
+# or MAVERICKS_PROFILE=1; output goes to MAVERICKS_PROFILE_DIR (default "profiles").
+# For every action this writes:
+#   <name>.prof       cProfile data (open with pstats, snakeviz, ...)
+#   <name>.collapsed  sampled stacks in collapsed format, for flamegraph.pl/speedscope
+#   <name>.txt        hotspot and allocation summary
+# and prints the top cumulative hotspots and the allocation sites at peak memory after the action.
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from config import Colors
+
+SAMPLE_INTERVAL = 0.005 # Seconds between stack samples for the collapsed output
+TOP_N = 5 # Hotspots and allocation sites shown in the console summary
+PEAK_SNAPSHOT_MIN_BYTES = 256 * 1024 # Growth before the first peak snapshot is worth taking
+PEAK_SNAPSHOT_GROWTH = 1.25 # Each later snapshot needs 25% more traced memory; snapshots pause the action
+
+enabled = os.getenv('MAVERICKS_PROFILE', '').lower() in ('1', 'true', 'yes')
+output_dir = os.getenv('MAVERICKS_PROFILE_DIR', 'profiles')
+_sequence = 0
+
+def enable(directory=None):
+    """Turns profiling on for the rest of the session."""
+    global enabled, output_dir
+    enabled = True
+    output_dir = directory or output_dir
+
+# --- Stack Sampling ---
+class _StackSampler(threading.Thread):
+    """Samples one thread's stack at a fixed interval and counts identical stacks.
+
+    cProfile only records caller/callee pairs, so flamegraph stacks come from sampling instead.
+    It also snapshots tracemalloc whenever traced memory reaches a new high, so allocation
+    sites can be reported as they were at the peak, even if freed before the action returns.
+    """
+
+    def __init__(self, thread_id):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.counts = {}
+        self.peak_snapshot = None
+        self._peak_size = tracemalloc.get_traced_memory()[0] + PEAK_SNAPSHOT_MIN_BYTES
+        self._halt = threading.Event()
+
+    def _watch_memory(self):
+        current = tracemalloc.get_traced_memory()[0]
+        if current >= self._peak_size:
+            self.peak_snapshot = tracemalloc.take_snapshot()
+            self._peak_size = current * PEAK_SNAPSHOT_GROWTH
+
+    def run(self):
+        while not self._halt.wait(SAMPLE_INTERVAL):
+            self._watch_memory()
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+# --- Reports ---
+def _hotspots(profiler, limit):
+    """Returns the functions with the most cumulative time as (cumtime, tottime, calls, label)."""
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, func), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        if filename == __file__ or '_lsprof.Profiler' in func:
+            continue # The profiler's own wrapper
+        label = func if filename == '~' else f"{func} ({os.path.basename(filename)}:{line})"
+        rows.append((cumtime, tottime, calls, label))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+def _allocations(before, after, limit):
+    """Returns the source lines that held the most memory in `after` compared with `before`."""
+    # Filtering the grouped lines is far cheaper than filter_traces on a large peak snapshot
+    ignore = (tracemalloc.__file__, threading.__file__, __file__)
+    diffs = after.compare_to(before, 'lineno')
+    return [d for d in diffs if d.size_diff > 0 and d.traceback[0].filename not in ignore][:limit]
+
+def _write_reports(base, name, elapsed, peak, profiler, sampler, at_peak, retained):
+    profiler.dump_stats(f"{base}.prof")
+    with open(f"{base}.collapsed", 'w') as f:
+        for stack, count in sorted(sampler.counts.items()):
+            f.write(f"{stack} {count}\n")
+
+    text = io.StringIO()
+    text.write(f"Action: {name}\nWall time: {elapsed:.4f}s\nPeak traced memory: {peak / 1024:.1f} KB\n\n")
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(30)
+    for title, allocations in (("Top allocation sites at peak memory", at_peak),
+                               ("Allocations still held after the action", retained)):
+        text.write(f"{title}:\n")
+        for diff in allocations:
+            frame = diff.traceback[0]
+            text.write(f"  {diff.size_diff / 1024:10.1f} KB {diff.count_diff:8} blocks  {frame.filename}:{frame.lineno}\n")
+        text.write("\n")
+    with open(f"{base}.txt", 'w') as f:
+        f.write(text.getvalue())
+
+def _print_summary(name, base, elapsed, peak, hotspots, allocations):
+    print(f"\n{Colors.HEADER}--- ⏱ Profile: {name} ({elapsed:.3f}s, peak memory {peak / 1024 / 1024:.2f} MB) ---{Colors.ENDC}")
+    print(f"{Colors.BOLD}{'Cumulative s':<14}{'Own s':<10}{'Calls':<9}{'Function'}{Colors.ENDC}")
+    for cumtime, tottime, calls, label in hotspots:
+        print(f"{cumtime:<14.4f}{tottime:<10.4f}{calls:<9}{label}")
+    if allocations:
+        print(f"{Colors.BOLD}{'KB at peak':<14}{'Blocks':<10}{'Line'}{Colors.ENDC}")
+        for diff in allocations:
+            frame = diff.traceback[0]
+            print(f"{diff.size_diff / 1024:<14.1f}{diff.count_diff:<10}{os.path.basename(frame.filename)}:{frame.lineno}")
+    print(f"{Colors.CYAN}Profile files: {base}.prof / .collapsed / .txt{Colors.ENDC}")
+
+# --- Entry Point ---
+def run(action, *args, **kwargs):
+    """Calls a menu action, profiling it when profiling is enabled. Returns the action's result."""
+    if not enabled:
+        return action(*args, **kwargs)
+
+    global _sequence
+    _sequence += 1
+    name = getattr(action, '__name__', 'action')
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{_sequence:03d}-{name}")
+
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    sampler = _StackSampler(threading.get_ident())
+    profiler = cProfile.Profile()
+
+    sampler.start()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        return action(*args, **kwargs)
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+        peak = tracemalloc.get_traced_memory()[1]
+        after = tracemalloc.take_snapshot()
+        if started_tracing:
+            tracemalloc.stop()
+        retained = _allocations(before, after, 20)
+        # Without a peak snapshot the action never grew much; what it still holds is the best view
+        at_peak = _allocations(before, sampler.peak_snapshot, 20) if sampler.peak_snapshot else retained
+        _write_reports(base, name, elapsed, peak, profiler, sampler, at_peak, retained)
+        _print_summary(name, base, elapsed, peak, _hotspots(profiler, TOP_N), at_peak[:TOP_N])
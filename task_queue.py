@@ -0,0 +1,165 @@
+# task_queue.py
+# A small SQLite-backed queue for deferred AI work (feedback, summaries, praise).
+# Jobs survive restarts, are deduplicated while pending, retried with backoff,
+# and their results wait in the user's inbox until the next menu is shown.
+
+import hashlib
+import json
+import threading
+import time
+
+from config import Colors
+import database
+
+# --- Configuration ---
+WORKER_COUNT = 2
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 2 # Retry n waits BACKOFF_BASE_SECONDS * 2**(n-1)
+BACKOFF_MAX_SECONDS = 300
+LEASE_SECONDS = 120 # A running job whose worker vanished is picked up again after this
+IDLE_POLL_SECONDS = 1.0
+FINISHED_JOB_RETENTION_SECONDS = 7 * 24 * 3600
+
+# kind -> (title shown on delivery, handler(payload) -> result text or None on failure)
+_handlers = {}
+_workers = []
+_wakeup = threading.Event()
+_stopping = threading.Event()
+
+def register_handler(kind, title, handler):
+    """Registers the function that performs jobs of `kind`."""
+    _handlers[kind] = (title, handler)
+
+# --- Producer Side ---
+def enqueue(kind, payload, user_name=None, priority=0, dedupe_key=None):
+    """Queues a job and returns immediately. Returns False if an identical job is already waiting.
+
+    `dedupe_key` defaults to a hash of the kind, user and payload.
+    """
+    payload_json = json.dumps(payload, sort_keys=True)
+    if dedupe_key is None:
+        dedupe_key = hashlib.sha256(f"{kind}\0{user_name}\0{payload_json}".encode()).hexdigest()
+    now = time.time()
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+    INSERT OR IGNORE INTO ai_jobs (kind, user_name, dedupe_key, payload, priority, next_attempt_at, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (kind, user_name, dedupe_key, payload_json, priority, now, now))
+    queued = cursor.rowcount == 1
+    conn.commit()
+    conn.close()
+    if queued:
+        _wakeup.set()
+    return queued
+
+def deliver_results(user_name):
+    """Prints finished job results for a user that haven't been shown yet."""
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    rows = cursor.execute('''
+    SELECT id, kind, result FROM ai_jobs WHERE user_name=? AND delivered=0 AND status='done' ORDER BY id
+    ''', (user_name,)).fetchall()
+    if rows:
+        cursor.executemany("UPDATE ai_jobs SET delivered=1 WHERE id=?", [(row['id'],) for row in rows])
+        conn.commit()
+    conn.close()
+
+    for row in rows:
+        title = _handlers.get(row['kind'], (row['kind'],))[0]
+        print(f"\n{Colors.CYAN}{title}:{Colors.ENDC}")
+        print(row['result'])
+    return len(rows)
+
+# --- Worker Side ---
+def _claim_job():
+    """Leases the highest-priority due job to the calling worker, or returns None."""
+    now = time.time()
+    due = '''
+    SELECT * FROM ai_jobs
+    WHERE (status='pending' AND next_attempt_at <= ?) OR (status='running' AND leased_until < ?)
+    ORDER BY priority DESC, id LIMIT 1
+    '''
+    conn = database.get_db_connection()
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    # Idle workers poll often; only take the write lock when something is due
+    if not cursor.execute(due, (now, now)).fetchone():
+        conn.close()
+        return None
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        job = cursor.execute(due, (now, now)).fetchone()
+        if job:
+            cursor.execute("UPDATE ai_jobs SET status='running', attempts=attempts+1, leased_until=? WHERE id=?",
+                           (now + LEASE_SECONDS, job['id']))
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return dict(job, attempts=job['attempts'] + 1) if job else None
+
+def _finish_job(job, result):
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    if result is not None:
+        cursor.execute("UPDATE ai_jobs SET status='done', result=?, leased_until=NULL WHERE id=?", (result, job['id']))
+    elif job['attempts'] >= MAX_ATTEMPTS:
+        cursor.execute("UPDATE ai_jobs SET status='failed', leased_until=NULL WHERE id=?", (job['id'],))
+    else:
+        delay = min(BACKOFF_BASE_SECONDS * 2 ** (job['attempts'] - 1), BACKOFF_MAX_SECONDS)
+        cursor.execute("UPDATE ai_jobs SET status='pending', next_attempt_at=?, leased_until=NULL WHERE id=?",
+                       (time.time() + delay, job['id']))
+    conn.commit()
+    conn.close()
+
+def run_next_job():
+    """Claims and runs one job. Returns False when nothing was due."""
+    job = _claim_job()
+    if not job:
+        return False
+    handler = _handlers.get(job['kind'])
+    result = None
+    if handler:
+        try:
+            result = handler[1](json.loads(job['payload']))
+        except Exception:
+            result = None # Treated like any other failed attempt
+    _finish_job(job, result)
+    return True
+
+def _worker_loop():
+    while not _stopping.is_set():
+        _wakeup.clear() # Before checking, so an enqueue during the check still wakes us
+        if not run_next_job():
+            _wakeup.wait(IDLE_POLL_SECONDS)
+
+def purge_finished_jobs(max_age=FINISHED_JOB_RETENTION_SECONDS):
+    """Deletes delivered and failed jobs older than `max_age` seconds."""
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM ai_jobs WHERE (delivered=1 OR status='failed') AND created_at < ?",
+                   (time.time() - max_age,))
+    conn.commit()
+    conn.close()
+
+def start_workers(count=WORKER_COUNT):
+    """Starts background worker threads. Jobs left over from a previous run are picked up too."""
+    if _workers:
+        return
+    _stopping.clear()
+    purge_finished_jobs()
+    for i in range(count):
+        worker = threading.Thread(target=_worker_loop, name=f"ai-worker-{i}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+
+def stop_workers(timeout=2.0):
+    """Asks worker threads to stop; unfinished jobs stay queued for the next run."""
+    _stopping.set()
+    _wakeup.set()
+    for worker in _workers:
+        worker.join(timeout)
+    _workers.clear()
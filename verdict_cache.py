@@ -0,0 +1,295 @@
+# verdict_cache.py
+# Remembers the verdicts of deterministic runs so re-submitting the same (or
+# trivially reformatted) code doesn't run it again, and fingerprints every
+# submission so identical code from different users is cheap to spot.
+
+import functools
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+import tokenize
+
+import database
+
+MAX_CACHED_VERDICTS = 10000
+MAX_VERDICT_AGE_SECONDS = 30 * 24 * 3600 # Older verdicts are re-run once, then cached afresh
+
+# --- Normalization ---
+# Normalized source keeps everything that can change behaviour and drops
+# comments and formatting. When in doubt it returns None: no caching at all.
+
+def _normalize_python(source):
+    parts = []
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(source).readline):
+            if tok.type in (tokenize.COMMENT, tokenize.NL, tokenize.ENDMARKER):
+                continue
+            if tok.type == tokenize.INDENT:
+                parts.append('<INDENT>') # Indentation depth, not its width, is what matters
+            elif tok.type == tokenize.DEDENT:
+                parts.append('<DEDENT>')
+            elif tok.type == tokenize.NEWLINE:
+                parts.append('<NEWLINE>')
+            else:
+                parts.append(tok.string)
+    except (tokenize.TokenError, SyntaxError):
+        return None
+    return '\0'.join(parts)
+
+_SAFE_PUNCTUATION = set('(){}[];,') # Never merge with a neighbour into a different token
+
+def _normalize_c_like(source):
+    # Java text blocks and C++ raw strings are too easy to get wrong; don't cache them
+    if '"""' in source or 'R"' in source:
+        return None
+    out = []
+    gap = None # Whitespace seen since the last emitted token: None, ' ' or '\n'
+    i, n = 0, len(source)
+
+    def emit(text):
+        nonlocal gap
+        # Newlines are kept (preprocessor directives end at them); spaces only where they can matter
+        if gap and out and (gap == '\n' or not (out[-1][-1] in _SAFE_PUNCTUATION or text[0] in _SAFE_PUNCTUATION)):
+            out.append(gap)
+        gap = None
+        out.append(text)
+
+    while i < n:
+        c = source[i]
+        if source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end < 0 else end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            if end < 0:
+                return None
+            i = end + 2
+            gap = gap or ' '
+        elif c in '"\'':
+            j = i + 1
+            while j < n and source[j] != c:
+                if source[j] == '\n':
+                    return None
+                j += 2 if source[j] == '\\' else 1
+            if j >= n:
+                return None
+            emit(source[i:j + 1])
+            i = j + 1
+        elif c.isspace():
+            gap = '\n' if c == '\n' or gap == '\n' else ' '
+            i += 1
+        else:
+            emit(c)
+            i += 1
+    return ''.join(out)
+
+def normalize_source(language, source):
+    """Returns a canonical form of `source` with comments and formatting removed, or None."""
+    if not source:
+        return ''
+    if language == 'python':
+        return _normalize_python(source)
+    if language in ('java', 'c++'):
+        return _normalize_c_like(source)
+    return None
+
+# --- Determinism Checks ---
+# Programs that read input or touch clocks, randomness, threads, processes, the file system,
+# the environment or hash/identity ordering can give different results on each run, so
+# they're never cached. This is a screen, not a proof: see also _ADDRESS_PATTERN below.
+_NONDETERMINISM_MARKERS = {
+    'python': re.compile(r'\b(input|stdin|open|random|randint|time|datetime|uuid|secrets|urandom|getpid|'
+                         r'threading|multiprocessing|asyncio|hash|id|set|frozenset|environ|getenv|socket|subprocess|'
+                         r'os|glob|pathlib)\b|\bobject\s*\('),
+    'java': re.compile(r'\b(Scanner|System\.in|BufferedReader|Console|Random|ThreadLocalRandom|random|'
+                       r'currentTimeMillis|nanoTime|LocalDate|LocalDateTime|LocalTime|Instant|UUID|Thread|'
+                       r'hashCode|identityHashCode|getenv|File|Files)\b'),
+    'c++': re.compile(r'\b(cin|scanf|getchar|getline|fopen|ifstream|fstream|rand|srand|random_device|time|'
+                      r'chrono|clock|thread|getenv|system|fork|getpid|opendir|readdir|filesystem)\b|%p'),
+}
+
+# Object addresses (Python's "at 0x7f...", C++ pointers, Java's Name@1b6d3586) differ between
+# runs, so a verdict whose output contains one is never stored.
+_ADDRESS_PATTERN = re.compile(r'0x[0-9a-fA-F]{6,}|\w@[0-9a-f]{6,8}\b')
+
+_FSTRING_START = getattr(tokenize, 'FSTRING_START', None) # Python 3.12+ tokenizes f-strings
+_FSTRING_END = getattr(tokenize, 'FSTRING_END', None)
+
+def _has_set_display(source):
+    """True if Python source contains a set literal or set comprehension.
+
+    A brace pair is a set unless it is empty or has a top-level ':' or '**' (a dict).
+    """
+    stack = [] # [opening bracket, looks like a dict] per open bracket
+    prev = None
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(source).readline):
+            if tok.type == _FSTRING_START:
+                stack.append(['f', True])
+            elif tok.type == _FSTRING_END:
+                while stack and stack.pop()[0] != 'f':
+                    pass
+            elif tok.type == tokenize.OP:
+                text = tok.string
+                if text in '([{':
+                    # Replacement fields of an f-string are not sets
+                    stack.append([text, bool(stack) and stack[-1][0] == 'f'])
+                elif text in ')]}':
+                    if not stack:
+                        return False
+                    opener, is_dict = stack.pop()
+                    if opener == '{' and not is_dict and prev != '{':
+                        return True
+                elif stack and (text == ':' or (text == '**' and prev in ('{', ','))):
+                    stack[-1][1] = True
+            if tok.type not in (tokenize.NL, tokenize.COMMENT):
+                prev = tok.string
+    except (tokenize.TokenError, SyntaxError):
+        return True # Can't tell; treat it as nondeterministic
+    return False
+
+def is_deterministic(language, code, check_code=None):
+    """True when the submission reads no input and uses nothing flagged as nondeterministic."""
+    markers = _NONDETERMINISM_MARKERS.get(language)
+    if markers is None:
+        return False
+    for source in (code, check_code):
+        if not source:
+            continue
+        if markers.search(source) or (language == 'python' and _has_set_display(source)):
+            return False
+    return True
+
+# --- Toolchain Versions ---
+_TOOLCHAIN_TOOLS = {'java': ('javac', 'java'), 'c++': ('g++',)}
+
+@functools.lru_cache(maxsize=None)
+def _probe_toolchain(language, tools):
+    """Asks each tool for its version once per installed binary (tools include path and mtime)."""
+    lines = []
+    for path, mtime in tools:
+        flag = '--version' if language == 'c++' else '-version'
+        try:
+            result = subprocess.run([path, flag], capture_output=True, text=True, timeout=10)
+            text = (result.stdout or result.stderr).strip()
+        except (OSError, subprocess.SubprocessError):
+            text = ''
+        lines.append(f"{path}@{mtime}:{text.splitlines()[0] if text else '?'}")
+    version = ' | '.join(lines)
+    purge_stale_verdicts(language, version)
+    return version
+
+@functools.lru_cache(maxsize=None)
+def _python_toolchain():
+    version = f"{sys.executable} {sys.version}"
+    purge_stale_verdicts('python', version)
+    return version
+
+def toolchain_version(language):
+    """Identifies the compiler/interpreter a verdict depends on, or None if it isn't installed."""
+    if language == 'python':
+        return _python_toolchain()
+    tools = []
+    for name in _TOOLCHAIN_TOOLS.get(language, ()):
+        path = shutil.which(name)
+        if not path:
+            return None
+        path = os.path.realpath(path)
+        tools.append((path, os.stat(path).st_mtime)) # An upgrade in place changes the mtime
+    return _probe_toolchain(language, tuple(tools)) if tools else None
+
+# --- Cache ---
+def cache_key(language, code, check_code=None):
+    """Returns the verdict cache key for a submission, or None if it must not be cached."""
+    if not is_deterministic(language, code, check_code):
+        return None
+    normalized_code = normalize_source(language, code)
+    normalized_check = normalize_source(language, check_code or '')
+    if normalized_code is None or normalized_check is None:
+        return None
+    toolchain = toolchain_version(language)
+    if toolchain is None:
+        return None
+    material = '\0\0'.join((language, toolchain, normalized_code, normalized_check))
+    return hashlib.sha256(material.encode()).hexdigest()
+
+def lookup(key):
+    """Returns the cached (error, output, usage) for a key, or None."""
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    row = cursor.execute("SELECT error, output, usage FROM verdict_cache WHERE cache_key=?", (key,)).fetchone()
+    if row:
+        cursor.execute("UPDATE verdict_cache SET hits = hits + 1 WHERE cache_key=?", (key,))
+        conn.commit()
+    conn.close()
+    if not row:
+        return None
+    return row['error'], row['output'], json.loads(row['usage']) if row['usage'] else None
+
+def store(key, language, error, output, usage=None):
+    """Saves a verdict under its cache key, unless its output shows object addresses.
+
+    Keeps the cache within MAX_CACHED_VERDICTS and MAX_VERDICT_AGE_SECONDS, evicting the
+    least-hit verdicts, oldest first.
+    """
+    if _ADDRESS_PATTERN.search(output or '') or _ADDRESS_PATTERN.search(error or ''):
+        return
+    now = time.time()
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+    INSERT OR REPLACE INTO verdict_cache (cache_key, language, toolchain, error, output, usage, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (key, language, toolchain_version(language), error, output, json.dumps(usage) if usage else None, now))
+    cursor.execute("DELETE FROM verdict_cache WHERE created_at < ?", (now - MAX_VERDICT_AGE_SECONDS,))
+    if cursor.execute("SELECT COUNT(*) FROM verdict_cache").fetchone()[0] > MAX_CACHED_VERDICTS:
+        cursor.execute('''
+        DELETE FROM verdict_cache WHERE cache_key IN (
+            SELECT cache_key FROM verdict_cache ORDER BY hits DESC, created_at DESC LIMIT -1 OFFSET ?
+        )
+        ''', (MAX_CACHED_VERDICTS,))
+    conn.commit()
+    conn.close()
+
+def purge_stale_verdicts(language, current_toolchain):
+    """Drops verdicts for a language that were produced by a different toolchain."""
+    conn = database.get_db_connection()
+    conn.cursor().execute("DELETE FROM verdict_cache WHERE language=? AND toolchain != ?", (language, current_toolchain))
+    conn.commit()
+    conn.close()
+
+# --- Duplicate Submissions ---
+def fingerprint(language, code):
+    """Toolchain-independent fingerprint of a submission's normalized source."""
+    normalized = normalize_source(language, code)
+    if normalized is None:
+        normalized = code # Fall back to the exact text so duplicates are still caught
+    return hashlib.sha256(f"{language}\0{normalized}".encode()).hexdigest()
+
+def record_submission(language, code, user_name):
+    """Indexes a submission's fingerprint under the user who sent it. Returns the fingerprint."""
+    fp = fingerprint(language, code)
+    conn = database.get_db_connection()
+    conn.cursor().execute('''
+    INSERT INTO submission_fingerprints (fingerprint, user_name, language, first_seen) VALUES (?, ?, ?, ?)
+    ON CONFLICT (fingerprint, user_name) DO UPDATE SET submissions = submissions + 1
+    ''', (fp, user_name, language, time.time()))
+    conn.commit()
+    conn.close()
+    return fp
+
+def get_shared_fingerprints(min_users=2, limit=20):
+    """Returns fingerprints submitted by at least `min_users` different users, most shared first."""
+    conn = database.get_db_connection()
+    rows = conn.cursor().execute('''
+    SELECT fingerprint, language, COUNT(*) AS users, GROUP_CONCAT(user_name, ', ') AS user_names
+    FROM submission_fingerprints GROUP BY fingerprint HAVING COUNT(*) >= ? ORDER BY users DESC LIMIT ?
+    ''', (min_users, limit)).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]